@@ -135,7 +135,7 @@ def set_max_values(bridge_map, island_map):
     for bridge in bridge_map.values():
         start = island_map[bridge.start]
         end = island_map[bridge.end]
-        bridge.maximum = min(3, start.number, end.number)
+        bridge.set_bounds(bridge.minimum, min(3, start.number, end.number))
 
 # Performs forward checking algorithm
 def initial_forward_check(island_map, bridge_map, loop=True, should_print=True):
@@ -173,7 +173,7 @@ def initial_forward_check(island_map, bridge_map, loop=True, should_print=True):
                     if loop:
                         changes_made = True
                 
-                bridge.minimum = max(bridge.minimum, diff)
+                bridge.set_bounds(max(bridge.minimum, diff), bridge.maximum)
                 if bridge.maximum < bridge.minimum:
                     print("Runs")
                     return False
@@ -200,7 +200,7 @@ def initial_forward_check(island_map, bridge_map, loop=True, should_print=True):
                     if loop:
                         changes_made = True
 
-                bridge.maximum = min(bridge.maximum, diff)
+                bridge.set_bounds(bridge.minimum, min(bridge.maximum, diff))
                 if bridge.maximum < bridge.minimum:
                     print("Runs")
                     return False
@@ -216,23 +216,21 @@ def place_bridge(bridge_id, planks, bridge_map):
     # print(f"Placing {planks} on {bridge_id}")
     bridge = bridge_map[bridge_id]    
     bridge.planks = planks
-    bridge.maximum = planks
-    bridge.minimum = planks
+    bridge.set_bounds(planks, planks)
     bridge.done = True
 
 def remove_bridge(bridge_id, bridge_map, prev_max, prev_min):
         bridge = bridge_map[bridge_id]
         bridge.planks = 0
-        bridge.maximum = prev_max
-        bridge.minimum = prev_min
+        bridge.set_bounds(prev_min, prev_max)
         bridge.done = False
 
 # Finds a mapping of islands to connected bridges
 def find_island_bridges(bridge_map, island_map):
     for bridge_id in bridge_map:
         bridge = bridge_map[bridge_id]
-        island_map[bridge.start].add_bridge(bridge_id)
-        island_map[bridge.end].add_bridge(bridge_id)
+        island_map[bridge.start].add_bridge(bridge_id, bridge)
+        island_map[bridge.end].add_bridge(bridge_id, bridge)
 
 # Marks all of an island's bridges as done
 def mark_island_bridges_done(island_map, bridge_map, island_id):
@@ -283,8 +281,7 @@ def get_current_min_max_state(bridge_map):
 def restore_min_max_state(bridge_map, mapping):
     for bridge_id in bridge_map:
         bridge = bridge_map[bridge_id]
-        bridge.minimum = mapping[bridge_id][0]
-        bridge.maximum = mapping[bridge_id][1]
+        bridge.set_bounds(mapping[bridge_id][0], mapping[bridge_id][1])
 
 # Prints solution
 def print_solution(map, bridge_map):
@@ -375,14 +372,14 @@ def backtrack(bridge_idx,
 
         # Adjust number of remaining islands
         new_remaining_islands = remaining_islands
-        if start_island.done(bridge_map):
+        if start_island.done():
             new_remaining_islands -= 1
-        if end_island.done(bridge_map):
+        if end_island.done():
             new_remaining_islands -= 1
         if new_remaining_islands == 0:
             return True
         
-        if start_island.over(bridge_map) or end_island.over(bridge_map):
+        if start_island.over() or end_island.over():
             continue
 
         if backtrack(bridge_idx + 1,
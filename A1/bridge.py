@@ -6,6 +6,7 @@ class Bridge(object):
         self.maximum = 3
         self.minimum = 0
         self.crossings = []
+        self.islands = []
 
         self.indices = []
         if horizontal:
@@ -17,3 +18,10 @@ class Bridge(object):
 
     def done(self):
         return self.maximum == self.minimum
+
+    # Sets new bounds, updating the running sums of both islands
+    def set_bounds(self, minimum, maximum):
+        for island in self.islands:
+            island.bridge_changed(self.minimum, self.maximum, minimum, maximum)
+        self.minimum = minimum
+        self.maximum = maximum
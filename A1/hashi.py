@@ -18,10 +18,14 @@
 #   Scan a hashi puzzle from stdin, store it in a numpy array,
 #   and print it out again.
 #
+import argparse
+import cProfile
 import numpy as np
+import os
 import sys
 import time
 import heapq
+from array import array
 
 from bridge import Bridge
 from island import Island
@@ -29,6 +33,26 @@ from island import Island
 remaining_islands = 0
 
 def main():
+    parser = argparse.ArgumentParser(description="Solve a hashi puzzle read from stdin.")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="profile the run with cProfile into DIR/puzzle.pstats")
+    args = parser.parse_args()
+
+    if args.profile is None:
+        solve()
+        return
+
+    os.makedirs(args.profile, exist_ok=True)
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        solve()
+    finally:
+        profile.disable()
+        profile.dump_stats(os.path.join(args.profile, "puzzle.pstats"))
+
+# Solves the puzzle on stdin and prints the solution
+def solve():
 
     global remaining_islands
 
@@ -40,7 +64,7 @@ def main():
     # Pre-processing
     remaining_islands = len(island_map)
     find_island_bridges(bridge_map, island_map)
-    find_bridge_crossings(bridge_map)
+    find_bridge_crossings(map, bridge_map)
     initial_forward_check(island_map, bridge_map)
     
     bridge_connectedness = find_connectedness(bridge_map, island_map)
@@ -55,25 +79,11 @@ def main():
 
 # Performs forward checking on constraints
 def forward_check(bridge_map, island_map):
-    
-    x = 0
-
     for island_id in island_map:
         island = island_map[island_id]
-        total_sum = 0
-        for bridge_id in island.bridges:
-            bridge = bridge_map[bridge_id]
-            total_sum += bridge.maximum
-
-        if island.number > total_sum:
+        if island.number > island.max_sum:
             return False
-    
-        total_sum = 0
-        for bridge_id in island.bridges:
-            bridge = bridge_map[bridge_id]
-            total_sum += bridge.minimum
-        
-        if island.number < total_sum:
+        if island.number < island.min_sum:
             return False
     
     return True
@@ -99,16 +109,11 @@ def initial_forward_check(island_map, bridge_map, print=False):
                 bridge = bridge_map[bridge_id]
 
                 # Find sum of all other bridges
-                max_sum = 0
-                for other_bridge_id in island.bridges:
-                    if other_bridge_id != bridge_id:
-                        other_bridge = bridge_map[other_bridge_id]
-                        max_sum += other_bridge.maximum
+                max_sum = island.max_sum - bridge.maximum
                 
                 diff = island.number - max_sum
-                old_minimum = bridge.minimum
-                bridge.minimum = max(bridge.minimum, diff)
-                if bridge.minimum != old_minimum:
+                if diff > bridge.minimum:
+                    bridge.set_bounds(diff, bridge.maximum)
                     changes_made = True
         
         for island_id in island_map:
@@ -117,30 +122,25 @@ def initial_forward_check(island_map, bridge_map, print=False):
                 bridge = bridge_map[bridge_id]
 
                 # Find sum of all other bridges
-                min_sum = 0
-                for other_bridge_id in island.bridges:
-                    if other_bridge_id != bridge_id:
-                        other_bridge = bridge_map[other_bridge_id]
-                        min_sum += other_bridge.minimum
+                min_sum = island.min_sum - bridge.minimum
                 
                 diff = island.number - min_sum
-                old_maximum = bridge.maximum
-                bridge.maximum = min(bridge.maximum, diff)
-                if bridge.maximum != old_maximum:
+                if diff < bridge.maximum:
+                    bridge.set_bounds(bridge.minimum, diff)
                     changes_made = True        
 
     # Adjust remaining islands
     for island_id in island_map:
         island = island_map[island_id]
-        if island.done(bridge_map):
+        if island.done():
             remaining_islands -= 1     
 
 # Finds a mapping of islands to connected bridges
 def find_island_bridges(bridge_map, island_map):
     for bridge_id in bridge_map:
         bridge = bridge_map[bridge_id]
-        island_map[bridge.start].add_bridge(bridge_id)
-        island_map[bridge.end].add_bridge(bridge_id)
+        island_map[bridge.start].add_bridge(bridge_id, bridge)
+        island_map[bridge.end].add_bridge(bridge_id, bridge)
 
 # Marks all of an island's bridges as done
 def mark_island_bridges_done(island_map, bridge_map, island_id):
@@ -260,7 +260,7 @@ def backtrack(bridge_idx,
         # Place plank
         place_bridge(current_bridge_id, num_planks, bridge_map, island_map)
 
-        if start_island.over(bridge_map) or end_island.over(bridge_map):
+        if start_island.over() or end_island.over():
             continue
 
         if backtrack(bridge_idx + 1,
@@ -297,15 +297,14 @@ def place_bridge(bridge_id, planks, bridge_map, island_map):
     start_island = island_map[start]
     end_island = island_map[end]
 
-    prev_done_start = start_island.done(bridge_map) 
-    prev_done_end = end_island.done(bridge_map)
+    prev_done_start = start_island.done() 
+    prev_done_end = end_island.done()
 
-    bridge.maximum = planks
-    bridge.minimum = planks
+    bridge.set_bounds(planks, planks)
 
-    if start_island.done(bridge_map) and not prev_done_start:
+    if start_island.done() and not prev_done_start:
         remaining_islands -= 1
-    if end_island.done(bridge_map) and not prev_done_end:
+    if end_island.done() and not prev_done_end:
         remaining_islands -= 1
 
 def remove_bridge(bridge_id, bridge_map, prev_max, prev_min, island_map):
@@ -315,15 +314,14 @@ def remove_bridge(bridge_id, bridge_map, prev_max, prev_min, island_map):
     start, end = bridge.start, bridge.end
     start_island = island_map[start]
     end_island = island_map[end]
-    prev_done_start = start_island.done(bridge_map)
-    prev_done_end = end_island.done(bridge_map)
+    prev_done_start = start_island.done()
+    prev_done_end = end_island.done()
 
-    bridge.maximum = prev_max
-    bridge.minimum = prev_min
+    bridge.set_bounds(prev_min, prev_max)
 
-    if not start_island.done(bridge_map) and prev_done_start:
+    if not start_island.done() and prev_done_start:
         remaining_islands += 1
-    if not end_island.done(bridge_map) and prev_done_end:
+    if not end_island.done() and prev_done_end:
         remaining_islands += 1
 
 # Marks bridge indices as occupied
@@ -344,16 +342,27 @@ def find_islands(map):
     return islands
 
 # Find what bridges are crossing which ones
-def find_bridge_crossings(bridge_map):
+def find_bridge_crossings(map, bridge_map):
+    # Id of the horizontal / vertical bridge running through each cell, -1 if none
+    horizontal = np.full(map.shape, -1, dtype=np.int32)
+    vertical = np.full(map.shape, -1, dtype=np.int32)
     for bridge_id in bridge_map:
         bridge = bridge_map[bridge_id]
-        for other_bridge_id in bridge_map:
-            other_bridge = bridge_map[other_bridge_id]
-            if other_bridge_id != bridge_id:
-                for index in other_bridge.indices:
-                    if index in bridge.indices:
-                        bridge.crossings.append(other_bridge_id)
-                        break
+        (r0, c0), (r1, c1) = bridge.start, bridge.end
+        if bridge.horizontal:
+            horizontal[r0, c0 + 1:c1] = bridge_id
+        else:
+            vertical[r0 + 1:r1, c0] = bridge_id
+
+    # Every cell used in both directions is one crossing pair
+    rows, cols = np.nonzero((horizontal >= 0) & (vertical >= 0))
+    crossings = {bridge_id: [] for bridge_id in bridge_map}
+    for a, b in zip(horizontal[rows, cols].tolist(), vertical[rows, cols].tolist()):
+        crossings[a].append(b)
+        crossings[b].append(a)
+
+    for bridge_id in bridge_map:
+        bridge_map[bridge_id].crossings = array("i", crossings[bridge_id])
 
 # Finds bridges in the map
 def find_bridges(map):
@@ -1,27 +1,50 @@
 from bridge import Bridge
 
+# Running sums of the island's bridges are kept up to date by Bridge.set_bounds,
+# so done / over / slack do not have to look at the bridges:
+#   assigned_sum - planks on the bridges whose value is decided
+#   min_sum, max_sum - sums of the bounds of all bridges
+#   unassigned - number of bridges whose value is not decided yet
 class Island(object):
     def __init__(self, x, y, number):
         self.x = x
         self.y = y
         self.number = number
         self.bridges = []
+        self.assigned_sum = 0
+        self.min_sum = 0
+        self.max_sum = 0
+        self.unassigned = 0
 
-    def add_bridge(self, bridge):
-        self.bridges.append(bridge)
+    def add_bridge(self, bridge_id, bridge):
+        self.bridges.append(bridge_id)
+        bridge.islands.append(self)
+        self.bridge_changed(None, None, bridge.minimum, bridge.maximum)
 
-    def done(self, bridge_map):
-        total_sum = 0
-        for bridge_id in self.bridges:
-            bridge = bridge_map[bridge_id]
-            if bridge.done():
-                total_sum += bridge.minimum
-        return total_sum == self.number
+    # Updates the running sums for a bridge whose bounds change from
+    # old_min..old_max (None for a new bridge) to new_min..new_max
+    def bridge_changed(self, old_min, old_max, new_min, new_max):
+        if old_min is None:
+            self.unassigned += 1
+        else:
+            self.min_sum -= old_min
+            self.max_sum -= old_max
+            if old_min == old_max:
+                self.assigned_sum -= old_min
+                self.unassigned += 1
+
+        self.min_sum += new_min
+        self.max_sum += new_max
+        if new_min == new_max:
+            self.assigned_sum += new_min
+            self.unassigned -= 1
+
+    def done(self):
+        return self.assigned_sum == self.number
     
-    def over(self, bridge_map):
-        total_sum = 0
-        for bridge_id in self.bridges:
-            bridge = bridge_map[bridge_id]
-            if bridge.done():
-                total_sum += bridge.minimum
-        return total_sum > self.number
\ No newline at end of file
+    def over(self):
+        return self.assigned_sum > self.number
+
+    # Planks the island still needs
+    def slack(self):
+        return self.number - self.assigned_sum
@@ -7,10 +7,13 @@ import numpy as np
 import sys
 import time
 import heapq
+from array import array
 import copy
+from collections import deque
 
 from bridge import Bridge
 from island import Island
+from trail import Trail
 
 def main():
     code = ".123456789abc"
@@ -22,7 +25,7 @@ def main():
 
     # Pre-processing
     find_island_bridges(bridge_map, island_map)
-    find_bridge_crossings(bridge_map)
+    find_bridge_crossings(map, bridge_map)
 
     set_max_values(bridge_map, island_map)
     initial_forward_check(island_map, bridge_map)
@@ -37,7 +40,8 @@ def main():
               island_map, 
               bridge_map, 
               len(island_map), 
-              bridge_order)
+              bridge_order,
+              Trail())
     end = time.time()
     print(f"Time: {end - start}\n")
 
@@ -45,16 +49,27 @@ def main():
     print_solution(map, bridge_map)
 
 # Find what bridges are crossing which ones
-def find_bridge_crossings(bridge_map):
+def find_bridge_crossings(map, bridge_map):
+    # Id of the horizontal / vertical bridge running through each cell, -1 if none
+    horizontal = np.full(map.shape, -1, dtype=np.int32)
+    vertical = np.full(map.shape, -1, dtype=np.int32)
     for bridge_id in bridge_map:
         bridge = bridge_map[bridge_id]
-        for other_bridge_id in bridge_map:
-            other_bridge = bridge_map[other_bridge_id]
-            if other_bridge_id != bridge_id:
-                for index in other_bridge.indices:
-                    if index in bridge.indices:
-                        bridge.crossing.append(other_bridge_id)
-                        break
+        (r0, c0), (r1, c1) = bridge.start, bridge.end
+        if bridge.horizontal:
+            horizontal[r0, c0 + 1:c1] = bridge_id
+        else:
+            vertical[r0 + 1:r1, c0] = bridge_id
+
+    # Every cell used in both directions is one crossing pair
+    rows, cols = np.nonzero((horizontal >= 0) & (vertical >= 0))
+    crossings = {bridge_id: [] for bridge_id in bridge_map}
+    for a, b in zip(horizontal[rows, cols].tolist(), vertical[rows, cols].tolist()):
+        crossings[a].append(b)
+        crossings[b].append(a)
+
+    for bridge_id in bridge_map:
+        bridge_map[bridge_id].crossings = array("i", crossings[bridge_id])
 
 # Performs forward checking on constraints
 def forward_check(bridge_map, island_map):
@@ -212,6 +227,60 @@ def initial_forward_check(island_map, bridge_map, loop=True, should_print=True):
             
     return True
 
+# Re-applies the min / max sum rule starting from the given islands only. An island
+# is queued again only when one of its bridges changes, and its bound sums are
+# computed once per visit and kept up to date as its bridges are tightened.
+# Old bounds are recorded on the trail so a failed placement can be undone.
+def propagate_islands(island_ids, island_map, bridge_map, trail):
+    queue = deque()
+    queued = set()
+    for island_id in island_ids:
+        if island_id not in queued:
+            queue.append(island_id)
+            queued.add(island_id)
+
+    while queue:
+        island_id = queue.popleft()
+        queued.remove(island_id)
+        island = island_map[island_id]
+
+        max_sum = 0
+        min_sum = 0
+        for bridge_id in island.bridges:
+            max_sum += bridge_map[bridge_id].maximum
+            min_sum += bridge_map[bridge_id].minimum
+
+        if island.number > max_sum or island.number < min_sum:
+            return False
+
+        for bridge_id in island.bridges:
+            bridge = bridge_map[bridge_id]
+            if bridge.maximum == bridge.minimum:
+                continue
+
+            # Bounds given by the sum of all other bridges
+            new_min = max(bridge.minimum, island.number - (max_sum - bridge.maximum))
+            new_max = min(bridge.maximum, island.number - (min_sum - bridge.minimum))
+            if new_max < new_min:
+                return False
+            if new_min == bridge.minimum and new_max == bridge.maximum:
+                continue
+
+            max_sum += new_max - bridge.maximum
+            min_sum += new_min - bridge.minimum
+            trail.save_attribute(bridge, "minimum")
+            trail.save_attribute(bridge, "maximum")
+            bridge.minimum = new_min
+            bridge.maximum = new_max
+
+            # Only the island on the other end of the bridge has to be revisited
+            other_id = bridge.end if bridge.start == island_id else bridge.start
+            if other_id not in queued:
+                queue.append(other_id)
+                queued.add(other_id)
+
+    return True
+
 def place_bridge(bridge_id, planks, bridge_map):
     # print(f"Placing {planks} on {bridge_id}")
     bridge = bridge_map[bridge_id]    
@@ -271,21 +340,6 @@ def find_connectedness(bridge_map, island_map):
 
     return bridge_connectedness
 
-# Given a bridge map, returns a mapping of bridges to their min and max values
-def get_current_min_max_state(bridge_map):
-    mapping = {}
-    for bridge_id in bridge_map:
-        bridge = bridge_map[bridge_id]
-        mapping[bridge_id] = (bridge.minimum, bridge.maximum)
-    return mapping
-
-# Applies the min_max_mapping to the bridge_map
-def restore_min_max_state(bridge_map, mapping):
-    for bridge_id in bridge_map:
-        bridge = bridge_map[bridge_id]
-        bridge.minimum = mapping[bridge_id][0]
-        bridge.maximum = mapping[bridge_id][1]
-
 # Prints solution
 def print_solution(map, bridge_map):
     result = []
@@ -318,7 +372,8 @@ def backtrack(bridge_idx,
               island_map, 
               bridge_map,
               remaining_islands, 
-              bridge_order):
+              bridge_order,
+              trail):
 
     # Base case - solution found
 
@@ -342,7 +397,8 @@ def backtrack(bridge_idx,
                          island_map, 
                          bridge_map, 
                          remaining_islands, 
-                         bridge_order)    
+                         bridge_order,
+                         trail)    
 
     # Placing the bridge
     prev_max = current_bridge.maximum
@@ -350,11 +406,17 @@ def backtrack(bridge_idx,
     prev_values = {}
 
     # Mark all crossing bridges to 0
-    for crossed_bridge in current_bridge.crossing:
+    for crossed_bridge in current_bridge.crossings:
         crossed_prev_max, crossed_prev_min = current_bridge.maximum, current_bridge.minimum
         prev_values[crossed_bridge] = (crossed_prev_max, crossed_prev_min)
         place_bridge(crossed_bridge, 0, bridge_map)
 
+    # Islands whose bridges were zeroed above also need to be revisited
+    crossed_islands = []
+    for crossed_bridge in current_bridge.crossings:
+        crossed_islands.append(bridge_map[crossed_bridge].start)
+        crossed_islands.append(bridge_map[crossed_bridge].end)
+
     start = current_bridge.start
     start_island = island_map[start]
 
@@ -367,10 +429,10 @@ def backtrack(bridge_idx,
     for num_planks in range(start_planks, end_planks, -1):
         
         place_bridge(current_bridge_id, num_planks, bridge_map)
-        current_state = get_current_min_max_state(bridge_map)
-        check = initial_forward_check(island_map, bridge_map, True, True)
+        mark = trail.mark()
+        check = propagate_islands([start, end] + crossed_islands, island_map, bridge_map, trail)
         if not check:
-            restore_min_max_state(bridge_map, current_state)
+            trail.undo(mark)
             continue
 
         # Adjust number of remaining islands
@@ -383,17 +445,22 @@ def backtrack(bridge_idx,
             return True
         
         if start_island.over(bridge_map) or end_island.over(bridge_map):
+            trail.undo(mark)
             continue
 
         if backtrack(bridge_idx + 1,
                     island_map, 
                     bridge_map, 
                     new_remaining_islands, 
-                    bridge_order):
+                    bridge_order,
+                    trail):
             return True
 
+        # Roll back only the bounds changed below this choice point
+        trail.undo(mark)
+
     # Restore crossed bridges
-    for crossed_bridge in current_bridge.crossing:
+    for crossed_bridge in current_bridge.crossings:
         crossed_prev_max, crossed_prev_min = prev_values[crossed_bridge]
         remove_bridge(crossed_bridge, bridge_map, crossed_prev_max, crossed_prev_min)
 
@@ -403,7 +470,8 @@ def backtrack(bridge_idx,
                         island_map, 
                         bridge_map, 
                         remaining_islands, 
-                        bridge_order):
+                        bridge_order,
+                        trail):
         return True
     
     # Remove bridge
@@ -0,0 +1,337 @@
+#************************************************************
+#   benchmark.py
+#   Time the solvers on puzzle corpora and compare the results with a
+#   stored baseline.
+#
+#   The corpora are the puzzles of sample.txt and puzzles generated by
+#   bridgen.py for each grid size and density, seeded so that every run
+#   solves the same puzzles. The hashi variants solve each corpus in one
+#   --batch --stats process, and a puzzle's time is the one the solver measured
+#   around it, so interpreter start-up and imports are left out; the memory is
+#   the peak resident size of that process and the nodes come from its stats.
+#   A1 and airplane.py only solve one puzzle per run, so they run as their own
+#   process per puzzle, timed by its wall time, and their nodes are not known.
+#
+#   The hashi-* variants try plank counts in the other --value-order
+#   strategies. hashi-learned keeps its statistics in a file for the whole
+#   benchmark, so each corpus is solved with what the earlier ones taught it.
+#   hashi-luby and hashi-geometric search with restarts.
+#
+#   With --baseline, a corpus that solves fewer puzzles, or whose p50, p95 or
+#   p99 time got slower by more than the tolerance, is reported as a regression
+#   and the exit status is 1. Corpora are matched by name only, so a baseline
+#   taken with other sizes, densities, count, seed or timeout is refused.
+#
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bridgen import generate, format_map
+from hashi import read_maps
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Solver variants: script and extra arguments, and whether it solves a corpus
+# in one --batch run. {workdir} in an argument is a directory kept for the
+# whole benchmark.
+SOLVERS = {
+    "hashi": ("hashi.py", [], True),
+    "hashi-ascending": ("hashi.py", ["--value-order", "ascending"], True),
+    "hashi-lcv": ("hashi.py", ["--value-order", "least_constraining"], True),
+    "hashi-learned": ("hashi.py", ["--value-order", "learned",
+                                   "--value-stats", os.path.join("{workdir}", "value_stats.json")],
+                      True),
+    "hashi-luby": ("hashi.py", ["--restarts", "luby"], True),
+    "hashi-geometric": ("hashi.py", ["--restarts", "geometric"], True),
+    "A1": (os.path.join("A1", "hashi.py"), [], False),
+    "airplane": ("airplane.py", [], False),
+}
+
+# Variants run unless --solvers says otherwise. airplane.py prints the board
+# from before its search rather than a solution, so it is left out.
+DEFAULT_SOLVERS = sorted(solver for solver in SOLVERS if solver != "airplane")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hashi solvers.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 10, 13],
+                        help="grid sizes of the generated corpora")
+    parser.add_argument("--densities", type=float, nargs="*", default=[],
+                        help="island densities of the generated corpora, in addition to "
+                             "bridgen's own (as dense as it gets)")
+    parser.add_argument("--count", type=int, default=10, help="puzzles per generated corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-sample", action="store_true", help="leave out sample.txt")
+    parser.add_argument("--solvers", nargs="+", choices=sorted(SOLVERS), default=DEFAULT_SOLVERS)
+    parser.add_argument("--timeout", type=float, default=10.0, metavar="SECONDS",
+                        help="time allowed per puzzle")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with earlier results")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    corpora = build_corpora(args.sizes, [None] + args.densities, args.count, args.seed,
+                            not args.no_sample)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for solver in args.solvers:
+            results[solver] = {}
+            for name, puzzles in corpora.items():
+                records = run_corpus(solver, puzzles, args.timeout, workdir)
+                results[solver][name] = summarize(records, args.timeout)
+    print_results(results)
+
+    report = {"settings": {"sizes": args.sizes, "densities": args.densities,
+                           "count": args.count, "seed": args.seed,
+                           "timeout": args.timeout, "sample": not args.no_sample},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(report, baseline, args.tolerance)
+        except ValueError as error:
+            sys.exit(str(error))
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            sys.exit(1)
+
+# Returns the puzzles of every corpus as text, by corpus name
+def build_corpora(sizes, densities, count, seed, sample):
+    corpora = {}
+    if sample:
+        corpora["sample"] = [format_map(map)
+                             for nrow, ncol, map in read_maps(os.path.join(HERE, "sample.txt"))]
+    for size in sizes:
+        for density in densities:
+            name = "%dx%d" % (size, size) if density is None else "%dx%d-d%g" % (size, size, density)
+            corpora[name] = [format_map(generate(size, size, random.Random("%d-%s-%d" % (seed, name, i)),
+                                                 density=density))
+                             for i in range(count)]
+    return corpora
+
+# Solves every puzzle of a corpus with a solver. Returns one record per puzzle
+# with its time, peak memory, nodes if known, and status: ok, wrong (the board
+# it printed is not a solution), error or timeout.
+def run_corpus(solver, puzzles, timeout, workdir):
+    script, extra, batch = SOLVERS[solver]
+    command = [sys.executable, os.path.join(HERE, script)]
+    command += [argument.format(workdir=workdir) for argument in extra]
+    if batch:
+        return run_batch(command, puzzles, timeout)
+    return [run_puzzle(command, text, timeout) for text in puzzles]
+
+# Solves one puzzle in a new process, timed by the wall time of that process
+def run_puzzle(command, text, timeout):
+    returncode, seconds, memory_kb, board, errors = run_process(command, text, timeout)
+    record = {"time": seconds, "memory_kb": memory_kb, "nodes": None}
+    if returncode is None:
+        record["status"] = "timeout"
+    elif returncode != 0:
+        record["status"] = "error"
+    elif not check_board(text, board):
+        record["status"] = "wrong"
+    else:
+        record["status"] = "ok"
+    return record
+
+# Solves all the puzzles in one process with --batch --stats, timed by the
+# per-puzzle times that the solver prints on stderr. The memory of every puzzle
+# is the peak of the whole process. Puzzles without a record, because the
+# process failed or ran out of time, are errors.
+def run_batch(command, puzzles, timeout):
+    command = command + ["--batch", "--stats", "--timeout", str(timeout)]
+    returncode, seconds, memory_kb, output, errors = run_process(
+        command, "\n".join(puzzles), timeout * len(puzzles) + BATCH_MARGIN)
+    boards = [board + "\n" for board in output.split("\n\n")]
+    timings = []
+    for line in errors.splitlines():
+        if line.startswith("{"):
+            timings.append(json.loads(line))
+
+    records = []
+    for index, text in enumerate(puzzles):
+        record = {"time": None, "memory_kb": memory_kb, "nodes": None}
+        if index >= len(timings):
+            record["status"] = "error"
+        else:
+            timing = timings[index]
+            record["time"] = timing["time"]
+            record["nodes"] = timing["stats"]["nodes"]
+            if timing.get("timed_out"):
+                record["status"] = "timeout"
+            elif not check_board(text, boards[index]):
+                record["status"] = "wrong"
+            else:
+                record["status"] = "ok"
+        records.append(record)
+    return records
+
+# Seconds a batch run may take beyond the time allowed for its puzzles
+BATCH_MARGIN = 30.0
+
+# Runs a command in the directory of its script with text on stdin, killing it
+# after timeout seconds. Returns its exit code (None if it was killed), wall
+# time, peak memory in kB, stdout and stderr.
+def run_process(command, text, timeout):
+    with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        stdin.write(text.encode())
+        stdin.seek(0)
+
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdin=stdin, stdout=stdout, stderr=stderr,
+                                   cwd=os.path.dirname(command[1]))
+        killed = False
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.perf_counter() - start > timeout:
+                process.kill()
+                pid, status, usage = os.wait4(process.pid, 0)
+                killed = True
+                break
+            time.sleep(0.002)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        stdout.seek(0)
+        output = stdout.read().decode(errors="replace")
+        stderr.seek(0)
+        errors = stderr.read().decode(errors="replace")
+    return None if killed else process.returncode, seconds, usage.ru_maxrss, output, errors
+
+# Planks of the bridge characters that the solvers print
+HORIZONTAL_PLANKS = {"-": 1, "─": 1, "=": 2, "═": 2, "E": 3}
+VERTICAL_PLANKS = {"|": 1, "│": 1, "\"": 2, "#": 3}
+
+# Returns True if board, the text printed by a solver, solves the puzzle:
+# every island is in place and gets its number of planks, every bridge runs
+# straight from one island to another, and the islands are all joined up
+def check_board(text, board):
+    puzzle = text.splitlines()
+    nrow, ncol = len(puzzle), len(puzzle[0])
+    rows = [line.ljust(ncol) for line in board.splitlines()[:nrow]]
+    if len(rows) < nrow:
+        return False
+
+    islands = {}
+    for r in range(nrow):
+        for c in range(ncol):
+            if puzzle[r][c] != ".":
+                if rows[r][c] != puzzle[r][c]:
+                    return False
+                islands[(r, c)] = 0
+    group = {island: island for island in islands}
+
+    def find(island):
+        while group[island] != island:
+            island = group[island]
+        return island
+
+    # Follow the bridges east and south of each island
+    bridge_cells = 0
+    for (r, c) in islands:
+        for dr, dc, planks_of in ((0, 1, HORIZONTAL_PLANKS), (1, 0, VERTICAL_PLANKS)):
+            row, col = r + dr, c + dc
+            if row >= nrow or col >= ncol or rows[row][col] not in planks_of:
+                continue
+            ch = rows[row][col]
+            while row < nrow and col < ncol and rows[row][col] == ch:
+                bridge_cells += 1
+                row, col = row + dr, col + dc
+            if (row, col) not in islands:
+                return False
+            islands[(r, c)] += planks_of[ch]
+            islands[(row, col)] += planks_of[ch]
+            group[find((r, c))] = find((row, col))
+
+    # No stray bridge characters, right sums, one group
+    stray = sum(1 for row in rows for ch in row if ch in HORIZONTAL_PLANKS or ch in VERTICAL_PLANKS)
+    if stray != bridge_cells:
+        return False
+    if any(islands[(r, c)] != int(puzzle[r][c], 16) for (r, c) in islands):
+        return False
+    return len(set(find(island) for island in islands)) <= 1
+
+# Summarises the runs of one solver on one corpus. Timed out runs count as
+# taking the whole timeout; failed runs are only counted, and so are wrong
+# ones, which do not count as solved.
+def summarize(records, timeout):
+    summary = {"puzzles": len(records)}
+    for status in ("ok", "wrong", "timeout", "error"):
+        summary[status] = sum(1 for record in records if record["status"] == status)
+
+    times = [min(record["time"], timeout) for record in records
+             if record["status"] not in ("wrong", "error")]
+    if times:
+        summary["p50"] = float(np.percentile(times, 50))
+        summary["p95"] = float(np.percentile(times, 95))
+        summary["p99"] = float(np.percentile(times, 99))
+        summary["max"] = max(times)
+    nodes = [record["nodes"] for record in records if record["nodes"] is not None]
+    if nodes:
+        summary["nodes_p50"] = float(np.percentile(nodes, 50))
+        summary["nodes_max"] = max(nodes)
+    summary["memory_kb"] = max(record["memory_kb"] for record in records) if records else 0
+    return summary
+
+def print_results(results):
+    print("%-15s %-12s %4s %4s %4s %4s %4s %8s %8s %8s %8s %10s %8s" %
+          ("solver", "corpus", "n", "ok", "bad", "tout", "err", "p50", "p95", "p99", "max", "nodes_p50",
+           "mem_MB"))
+    for solver in results:
+        for name, summary in results[solver].items():
+            print("%-15s %-12s %4d %4d %4d %4d %4d %8s %8s %8s %8s %10s %8.1f" % (
+                solver, name, summary["puzzles"], summary["ok"], summary["wrong"],
+                summary["timeout"], summary["error"],
+                format_seconds(summary.get("p50")), format_seconds(summary.get("p95")),
+                format_seconds(summary.get("p99")), format_seconds(summary.get("max")),
+                "-" if "nodes_p50" not in summary else "%d" % summary["nodes_p50"],
+                summary["memory_kb"] / 1024.0))
+
+def format_seconds(seconds):
+    return "-" if seconds is None else "%.3f" % seconds
+
+# Returns a line for every corpus whose p50, p95 or p99 time, or number of solved
+# puzzles, got worse than in the baseline. Both are reports as written by main;
+# raises ValueError if the baseline was taken with other settings.
+def compare(report, baseline, tolerance):
+    settings = baseline.get("settings", {})
+    different = sorted(key for key in report["settings"]
+                       if settings.get(key) != report["settings"][key])
+    if different:
+        raise ValueError("baseline was taken with other settings: " +
+                         ", ".join("%s %s, now %s" % (key, settings.get(key), report["settings"][key])
+                                   for key in different))
+
+    regressions = []
+    results = report["results"]
+    for solver in results:
+        for name, summary in results[solver].items():
+            old = baseline["results"].get(solver, {}).get(name)
+            if old is None:
+                continue
+            if summary["ok"] < old["ok"]:
+                regressions.append("%s %s: solved %d, was %d" % (solver, name, summary["ok"], old["ok"]))
+            for key in ("p50", "p95", "p99"):
+                if key in summary and key in old and summary[key] > old[key] * (1 + tolerance):
+                    regressions.append("%s %s: %s %.3fs, was %.3fs" %
+                                       (solver, name, key, summary[key], old[key]))
+    return regressions
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
 class Bridge(object):
+    __slots__ = ("id", "planks", "marked", "start", "end", "horizontal",
+                 "done", "maximum", "minimum", "crossings", "indices")
+
     def __init__(self, id, start, end, horizontal):
         self.id = id
         self.planks = 0
@@ -9,6 +12,7 @@ class Bridge(object):
         self.done = False
         self.maximum = 3
         self.minimum = 0
+        self.crossings = []
 
         self.indices = []
         if horizontal:
@@ -0,0 +1,59 @@
+from array import array
+
+# Bucket queue of undecided bridges
+#   Each bridge sits in the bucket for its domain size (maximum - minimum) and its
+#   tie-break priority, and buckets are scanned from the smallest domain and
+#   lowest priority up. There are only a few dozen buckets, so picking the next
+#   bridge costs the same whatever the size of the puzzle. Moves are recorded on
+#   the trail so the buckets follow the bounds when the search backtracks.
+#   The buckets hold a key for each bridge rather than its id, and the order
+#   the keys come out of a bucket's set decides between bridges in the same
+#   bucket. By default the key is the id itself; tie_break, a permutation of
+#   the bridges, gives the keys instead, which shuffles the ties without making
+#   a pick any slower.
+class BridgeQueue(object):
+    __slots__ = ("buckets", "bucket_of", "priority", "num_priorities", "key", "bridge_of",
+                 "trail")
+
+    def __init__(self, priority, trail, tie_break=None):
+        self.priority = array("i", priority)
+        self.num_priorities = max(self.priority, default=0) + 1
+        self.buckets = [set() for _ in range(3 * self.num_priorities)]
+        self.bucket_of = array("i", [-1] * len(self.priority))
+        if tie_break is None:
+            tie_break = range(len(self.priority))
+        self.key = array("i", tie_break)
+        self.bridge_of = array("i", bytes(4 * len(self.key)))
+        for bridge, key in enumerate(self.key):
+            self.bridge_of[key] = bridge
+        self.trail = trail
+
+    # Returns the bucket of a bridge with the given domain size, -1 once it is decided
+    def bucket_index(self, bridge, size):
+        if size == 0:
+            return -1
+        return (size - 1) * self.num_priorities + self.priority[bridge]
+
+    # Moves a bridge to another bucket without recording it
+    def move(self, bridge, index):
+        old_index = self.bucket_of[bridge]
+        if old_index != -1:
+            self.buckets[old_index].discard(self.key[bridge])
+        if index != -1:
+            self.buckets[index].add(self.key[bridge])
+        self.bucket_of[bridge] = index
+
+    # Files a bridge under its new domain size
+    def update(self, bridge, size):
+        index = self.bucket_index(bridge, size)
+        old_index = self.bucket_of[bridge]
+        if index != old_index:
+            self.trail.push(self.move, bridge, old_index)
+            self.move(bridge, index)
+
+    # Returns the undecided bridge with the smallest domain, -1 if there is none
+    def select(self):
+        for bucket in self.buckets:
+            if bucket:
+                return self.bridge_of[next(iter(bucket))]
+        return -1
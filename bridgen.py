@@ -0,0 +1,181 @@
+#************************************************************
+#   bridgen.py
+#   Python port of bridgen.c (SPARSE variant): generate a random hashi
+#   puzzle of the given size. Unlike bridgen.c, the random numbers come from
+#   a seeded random.Random, so the same seed always gives the same puzzle.
+#
+#   density, if given, stops adding bridges once that fraction of the cells
+#   are islands; by default bridges are added until it gets too difficult,
+#   as in bridgen.c.
+#
+import argparse
+import random
+
+import numpy as np
+
+NONE = -1
+HORIZONTAL = 0
+VERTICAL = 1
+
+EAST = 0
+NORTH = 1
+WEST = 2
+SOUTH = 3
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random hashi puzzle.")
+    parser.add_argument("nrow", type=int)
+    parser.add_argument("ncol", type=int, nargs="?")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--density", type=float)
+    args = parser.parse_args()
+
+    ncol = args.nrow if args.ncol is None else args.ncol
+    map = generate(args.nrow, ncol, random.Random(args.seed), density=args.density)
+    print(format_map(map), end="")
+
+# Generates a puzzle of nrow x ncol, returning its island numbers as an array
+def generate(nrow, ncol, rng, max_plank=3, density=None):
+    nrow = min(max(nrow, 3), 100)
+    ncol = min(max(ncol, 3), 100)
+    map = np.zeros((nrow, ncol), dtype=np.int32)       # islands
+    dirn = np.full((nrow, ncol), NONE, dtype=np.int32)  # NONE, HORIZONTAL or VERTICAL
+    nplank = np.zeros((nrow, ncol), dtype=np.int32)
+
+    # add the first bridge
+    while not add_bridge(True, nrow, ncol, max_plank, map, dirn, nplank, rng):
+        pass
+
+    # keep adding bridges until it becomes too difficult
+    max_islands = None if density is None else density * nrow * ncol
+    nfail = 0
+    while nfail < 200:
+        if max_islands is not None and np.count_nonzero(map) >= max_islands:
+            break
+        nfail = 0
+        while nfail < 200 and not add_bridge(False, nrow, ncol, max_plank, map, dirn, nplank, rng):
+            nfail += 1
+
+    return map
+
+# Returns the puzzle in the text format read by the solvers
+def format_map(map):
+    code = ".123456789abc"
+    return "".join("".join(code[n] for n in row) + "\n" for row in map.tolist())
+
+# Return True if location (r,c) is next to an existing island.
+def island_neighbor(r, c, nrow, ncol, map):
+    return ((c < ncol-1 and map[r, c+1] > 0)
+            or (r > 0 and map[r-1, c] > 0)
+            or (c > 0 and map[r, c-1] > 0)
+            or (r < nrow-1 and map[r+1, c] > 0))
+
+# Find a random start and end location and add a new bridge.
+def add_bridge(map_empty, nrow, ncol, max_plank, map, dirn, nplank, rng):
+    if map_empty:   # this will be the first bridge
+        r = rng.randrange(nrow)
+        c = rng.randrange(ncol)
+    else:           # look for an existing island or bridge which can
+                    # be used as the starting point for a new bridge
+        while True:
+            r = rng.randrange(nrow)
+            c = rng.randrange(ncol)
+            if dirn[r, c] != NONE or map[r, c] != 0:
+                break
+        if island_neighbor(r, c, nrow, ncol, map):
+            return False
+
+    # choose number of planks
+    num_plank = 1 + rng.randrange(max_plank)
+
+    # choose direction and end location for new bridge
+    direction = rng.randrange(4)
+    if direction == EAST:
+        c0 = c
+        r0 = r1 = r
+        c = c0+1
+        if c > ncol-1:
+            return False
+        while c < ncol-1 and dirn[r, c] == NONE and map[r, c] == 0:
+            c += 1
+        if dirn[r, c] != NONE:
+            c -= 1
+        if c < c0+2:    # too short
+            return False
+        c1 = c0 + 2 + rng.randrange(c - c0 - 1)
+        if island_neighbor(r1, c1, nrow, ncol, map):
+            return False
+        dirn[r, c0+1:c1] = HORIZONTAL
+        nplank[r, c0+1:c1] = num_plank
+
+    elif direction == NORTH:
+        c0 = c1 = c
+        r1 = r
+        r = r1-1
+        if r < 0:
+            return False
+        while r > 0 and dirn[r, c] == NONE and map[r, c] == 0:
+            r -= 1
+        if dirn[r, c] != NONE:
+            r += 1
+        if r > r1-2:
+            return False
+        r0 = r1 - 2 - rng.randrange(r1 - r - 1)
+        if island_neighbor(r0, c0, nrow, ncol, map):
+            return False
+        dirn[r0+1:r1, c] = VERTICAL
+        nplank[r0+1:r1, c] = num_plank
+
+    elif direction == WEST:
+        c1 = c
+        r0 = r1 = r
+        c = c1-1
+        if c < 0:
+            return False
+        while c > 0 and dirn[r, c] == NONE and map[r, c] == 0:
+            c -= 1
+        if dirn[r, c] != NONE:
+            c += 1
+        if c > c1-2:
+            return False
+        c0 = c1 - 2 - rng.randrange(c1 - c - 1)
+        if island_neighbor(r0, c0, nrow, ncol, map):
+            return False
+        dirn[r, c0+1:c1] = HORIZONTAL
+        nplank[r, c0+1:c1] = num_plank
+
+    else:   # SOUTH
+        c0 = c1 = c
+        r0 = r
+        r = r0+1
+        if r > nrow-1:
+            return False
+        while r < nrow-1 and dirn[r, c] == NONE and map[r, c] == 0:
+            r += 1
+        if dirn[r, c] != NONE:
+            r -= 1
+        if r < r0+2:
+            return False
+        r1 = r0 + 2 + rng.randrange(r - r0 - 1)
+        if island_neighbor(r1, c1, nrow, ncol, map):
+            return False
+        dirn[r0+1:r1, c] = VERTICAL
+        nplank[r0+1:r1, c] = num_plank
+
+    # re-compute number of planks at both ends of new bridge
+    for (r, c) in ((r0, c0), (r1, c1)):
+        nplank[r, c] = 0
+        map[r, c] = 0
+        if c < ncol-1 and dirn[r, c+1] == HORIZONTAL:
+            map[r, c] += nplank[r, c+1]
+        if r > 0 and dirn[r-1, c] == VERTICAL:
+            map[r, c] += nplank[r-1, c]
+        if c > 0 and dirn[r, c-1] == HORIZONTAL:
+            map[r, c] += nplank[r, c-1]
+        if r < nrow-1 and dirn[r+1, c] == VERTICAL:
+            map[r, c] += nplank[r+1, c]
+
+    return True
+
+if __name__ == '__main__':
+    main()
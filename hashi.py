@@ -7,165 +7,831 @@
 #   where n is the number on the current insland and sum is the sum of the other bridges. The same logic is applied to 
 #   min values. This leads to a much smaller search space.
 # 
-#   Furthermore, another forward check is triggered whenever a bridge is placed, to ensure that all bridges still 
-#   have possible values. If a bridge has no possible values, it backtracks.
+#   Furthermore, whenever a bridge is placed, the same rule is re-applied with a worklist that only revisits the
+#   islands whose bridges changed. Each island keeps running sums of its bridges' minimum and maximum values, so a
+#   placement costs time proportional to the bridges around it. If a bridge has no possible values, it backtracks.
 #   
-#   When it comes to choose the next bridge to be assigned, I chose the bridge with the lowest connectedness, where
-#   connectedness is the sum of bridges connected to its start and end islands.
+#   All islands have to end up in one connected group. Islands joined by bridges that must carry planks are
+#   merged in a union-find structure, and a group whose islands are all complete fails straight away if other
+#   islands are still left outside it.
+#
+#   When it comes to choose the next bridge to be assigned, I chose the undecided bridge with the fewest possible
+#   values left, and among those the one with the lowest connectedness, where connectedness is the sum of bridges
+#   connected to its start and end islands. Bridges are kept in a bucket queue that the forward check updates,
+#   so the choice follows the bounds as they tighten.
 
 #************************************************************
 #   scan_print_map.py
 #   Scan a hashi puzzle from stdin, store it in a numpy array,
 #   and print it out again.
 #
+import argparse
+import json
+import mmap
 import numpy as np
+import os
+import random
 import sys
 import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 import heapq
+from array import array
 
 from bridge import Bridge
 from island import Island
+from puzzle import Puzzle
+from bridge_queue import BridgeQueue
+from stats import SolverStats
+from solution import Solution
+from nogoods import NogoodStore
+from profiling import Profiler
+from transposition import TranspositionTable
+from value_order import ValueOrder
+from restarts import RestartSchedule
+from solution_cache import SolutionCache, canonical_form, transform_bridges, restore_bridges
 
 def main():
-    code = ".123456789abc"
-    map = scan_map()
+    parser = argparse.ArgumentParser(description="Solve a hashi puzzle read from stdin.")
+    parser.add_argument("--stats", action="store_true",
+                        help="print search counters and phase timings as JSON on stderr")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="solve every puzzle in FILE (or stdin), separated by blank lines")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="number of worker processes: one puzzle per worker with --batch, "
+                             "otherwise the search tree of the single puzzle is split between them")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                        help="give up on a puzzle after searching for this long")
+    parser.add_argument("--cache", nargs="?", const="", metavar="FILE",
+                        help="reuse the solutions of puzzles seen before, including rotated and "
+                             "mirrored copies; FILE keeps them in an sqlite database across runs")
+    parser.add_argument("--output", choices=("board", "bridges"), default="board",
+                        help="print each solution as a board, or as one JSON line "
+                             "listing the bridges and their planks")
+    parser.add_argument("--value-order", choices=ValueOrder.STRATEGIES, default="descending",
+                        help="order to try the plank counts of each bridge in")
+    parser.add_argument("--value-stats", metavar="FILE",
+                        help="keep the statistics of --value-order learned in FILE across runs")
+    parser.add_argument("--restarts", choices=RestartSchedule.SCHEDULES,
+                        help="start the search over with a growing node limit, breaking "
+                             "ties in the bridge order at random each time")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random tie-breaking of --restarts")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="profile each puzzle into DIR, and every puzzle of a batch into "
+                             "DIR/all.*; runs in this process only, so --jobs is ignored")
+    parser.add_argument("--profile-mode", choices=Profiler.MODES, default="cprofile",
+                        help="write cProfile .pstats files, or .collapsed stacks from a "
+                             "sampling profiler for flame graphs")
+    args = parser.parse_args()
+
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler(args.profile, args.profile_mode)
+        args.jobs = 1
+
+    if args.batch is not None:
+        run_batch(args.batch, args.jobs, args.timeout, args.stats, args.output, args.cache,
+                  profiler, args.value_order, args.value_stats, args.restarts, args.seed)
+    else:
+        stats = SolverStats()
+        with stats.phase("scan_map"):
+            nrow, ncol, map = scan_map()
+
+        cache = open_cache(args.cache)
+        solver = HashiSolver(args.timeout, args.jobs, cache=cache, value_order=args.value_order,
+                             restarts=args.restarts, seed=args.seed)
+        if args.value_stats is not None:
+            solver.value_order.load(args.value_stats)
+        if profiler is None:
+            solution = solver.solve(map, stats)
+        else:
+            with profiler.run("puzzle"):
+                solution = solver.solve(map, stats)
+        if cache is not None:
+            cache.close()
+        if args.value_stats is not None:
+            solver.value_order.save(args.value_stats)
+
+        # Print solution
+        write_solution(solution, args.output)
+
+        if args.stats:
+            print(stats.to_json(), file=sys.stderr)
+
+    if profiler is not None:
+        profiler.finish()
+
+# Prints a solution in the given output format
+def write_solution(solution, output, separator=""):
+    if output == "bridges":
+        sys.stdout.write(solution.to_json() + "\n")
+    else:
+        sys.stdout.write(render_solution(solution.grid, solution.bridge_map) + separator)
+
+# Solves every puzzle in a file, printing each solution (boards followed by a
+# blank line) and one JSON line per puzzle with its timing on stderr. The
+# statistics of value_order are only loaded from and saved to value_stats
+# when the puzzles are solved in this process.
+def run_batch(path, jobs, time_limit, show_stats, output="board", cache_path=None,
+              profiler=None, value_order="descending", value_stats=None, restarts=None, seed=0):
+    source = sys.stdin.buffer if path == "-" else path
+    settings = {"value_order": value_order, "restarts": restarts, "seed": seed}
+    cache = None
+    solver = None
+    if jobs > 1:
+        results = solve_batch_parallel(source, jobs, time_limit, cache_path=cache_path,
+                                       settings=settings)
+    else:
+        cache = open_cache(cache_path)
+        solver = HashiSolver(time_limit, cache=cache, **settings)
+        if value_stats is not None:
+            solver.value_order.load(value_stats)
+        results = solve_batch(source, solver, profiler)
+
+    for index, (solution, seconds) in enumerate(results):
+        write_solution(solution, output, "\n")
+        record = {"puzzle": index, "solved": solution.solved, "time": seconds}
+        if solution.timed_out:
+            record["timed_out"] = True
+        if show_stats:
+            record["stats"] = solution.stats.as_dict()
+        print(json.dumps(record), file=sys.stderr)
+
+    if cache is not None:
+        cache.close()
+    if solver is not None and value_stats is not None:
+        solver.value_order.save(value_stats)
+
+# Opens the cache selected by --cache: None without the flag, in memory for an
+# empty path, otherwise backed by the given sqlite file
+def open_cache(path):
+    if path is None:
+        return None
+    return SolutionCache(path=path or None)
+
+# Solves puzzles given as arrays of island numbers, for use as a library.
+# All state lives in the objects built for each call, so one solver can be
+# reused for any number of puzzles and nothing is printed.
+class HashiSolver(object):
+
+    # time_limit is the number of seconds the search may run for each puzzle.
+    # With jobs > 1, the first split_depth levels of the search tree are
+    # expanded here and the subtrees are searched by a pool of processes.
+    # stop_event, if given, is polled by the search, which gives up once it is set.
+    # cache, a SolutionCache, returns known solutions without searching.
+    # The search learns up to max_nogoods nogoods per puzzle, none if it is 0.
+    # A nogood is a whole failed path, which one depth-first run never meets
+    # again, so by default they are only learned when the search restarts.
+    # Failed states are kept in a transposition table of 2 ** table_bits slots
+    # with the given replacement policy; table_bits = 0 turns it off. Only a
+    # restarted run can reach a state an earlier run proved to fail, so by
+    # default the table is only kept when the search restarts.
+    # presolve runs the deduction rules of PRESOLVE_RULES before the search.
+    # value_order names the ValueOrder strategy for trying plank counts; the
+    # "learned" one learns from every puzzle this solver solves.
+    # restarts names a RestartSchedule of node limits, with restart_base and
+    # restart_factor as its base and factor; the tie-breaking between restarts
+    # is drawn from random.Random(seed). None searches without restarting.
+    def __init__(self, time_limit=None, jobs=1, split_depth=3, stop_event=None, cache=None,
+                 max_nogoods=None, table_bits=None, table_policy="two_tier", presolve=True,
+                 value_order="descending", restarts=None, restart_base=100, restart_factor=1.5,
+                 seed=0):
+        self.time_limit = time_limit
+        self.jobs = jobs
+        self.split_depth = split_depth
+        self.stop_event = stop_event
+        self.cache = cache
+        if max_nogoods is None:
+            max_nogoods = 0 if restarts is None else 10000
+        self.max_nogoods = max_nogoods
+        if table_bits is None:
+            table_bits = 0 if restarts is None else 16
+        self.table_bits = table_bits
+        self.table_policy = table_policy
+        self.presolve = presolve
+        self.value_order = ValueOrder(value_order)
+        self.restarts = None
+        if restarts is not None:
+            self.restarts = RestartSchedule(restarts, restart_base, restart_factor)
+        self.seed = seed
+
+    # Returns the search options to give the solvers of worker processes
+    def settings(self):
+        settings = {"presolve": self.presolve,
+                    "value_order": self.value_order.strategy,
+                    "seed": self.seed,
+                    "max_nogoods": self.max_nogoods,
+                    "table_bits": self.table_bits,
+                    "table_policy": self.table_policy}
+        if self.restarts is not None:
+            settings["restarts"] = self.restarts.schedule
+            settings["restart_base"] = self.restarts.base
+            settings["restart_factor"] = self.restarts.factor
+        return settings
+
+    # Solves one puzzle, returning a Solution. prefix is a list of
+    # (bridge, planks) assignments to make before searching. bounds, as saved
+    # by save_bounds from a presolved copy of the puzzle, replace presolve.
+    def solve(self, grid, stats=None, prefix=(), bounds=None):
+        if stats is None:
+            stats = SolverStats()
+        map = np.asarray(grid, dtype=np.int32)
+        if self.cache is None or prefix or bounds is not None:
+            return self.search(map, stats, prefix, bounds)
+
+        with stats.phase("cache_lookup"):
+            key, transform = canonical_form(map)
+            entry = self.cache.get(key)
+        if entry is not None:
+            return cached_solution(map, transform, entry, stats)
+
+        solution = self.search(map, stats)
+        if solution.complete():
+            self.cache.put(key, cache_entry(solution, transform))
+        return solution
+
+    # Solves one puzzle without looking at the cache
+    def search(self, map, stats, prefix=(), bounds=None):
+        timed_out = False
+        cancelled = False
+
+        # Data Structures
+        with stats.phase("find_islands"):
+            island_map = find_islands(map)
+        with stats.phase("find_bridges"):
+            bridge_map  = find_bridges(map)
+        with stats.phase("build_puzzle"):
+            find_island_bridges(bridge_map, island_map)
+            puzzle = Puzzle(island_map, bridge_map)
+            puzzle.stats = stats
+            puzzle.stop_event = self.stop_event
+            if self.max_nogoods:
+                puzzle.nogoods = NogoodStore(puzzle.num_bridges(), self.max_nogoods)
+            if self.table_bits:
+                puzzle.table = TranspositionTable(self.table_bits, self.table_policy)
+                puzzle.start_zobrist(random.Random(0))
+            if self.value_order.strategy != "descending":
+                puzzle.value_order = self.value_order
+            if self.time_limit is not None:
+                puzzle.deadline = time.perf_counter() + self.time_limit
+
+        with stats.phase("initial_forward_check"):
+            solved = initial_forward_check(puzzle)
+
+        try:
+            if solved and bounds is not None:
+                with stats.phase("presolve"):
+                    solved = load_bounds(puzzle, bounds)
+            elif solved and self.presolve:
+                with stats.phase("presolve"):
+                    solved = presolve(puzzle)
+
+            if solved:
+                with stats.phase("search"):
+                    bridge_connectedness = find_connectedness(puzzle)
+                    puzzle.bridge_queue = make_bridge_queue(puzzle, bridge_connectedness)
+                    if self.jobs > 1 and not prefix:
+                        return self.solve_split(map, puzzle, bridge_map)
+
+                    solved = replay(puzzle, prefix)
+                    if solved and self.restarts is None:
+                        solved = backtrack(puzzle, prefix)
+                    elif solved:
+                        solved = restart_search(puzzle, prefix, bridge_connectedness,
+                                                self.restarts, random.Random(self.seed))
+        except SearchTimeout:
+            solved = False
+            timed_out = True
+        except SearchCancelled:
+            solved = False
+            cancelled = True
+
+        if solved and self.value_order.strategy == "learned":
+            self.value_order.record(puzzle)
+        puzzle.store(bridge_map)
+        return Solution(map, bridge_map, solved, stats, timed_out, cancelled)
+
+    # Splits the search tree of a prepared puzzle and searches the subtrees in
+    # worker processes. The first solution found stops the other workers, and
+    # so does the time limit: workers get it as a wall-clock deadline, so that
+    # subtrees still waiting in the pool do not start a full time limit of
+    # their own. Workers start from the bounds presolved here instead of
+    # presolving the puzzle again.
+    def solve_split(self, map, puzzle, bridge_map):
+        stats = puzzle.stats
+        bounds = save_bounds(puzzle)
+        prefixes = []
+        if split_search(puzzle, self.split_depth, [], prefixes):
+            puzzle.store(bridge_map)
+            return Solution(map, bridge_map, True, stats)
+
+        deadline = None
+        time_left = None
+        if puzzle.deadline is not None:
+            time_left = max(0.0, puzzle.deadline - time.perf_counter())
+            deadline = time.time() + time_left
+
+        packed = pack_map(map)
+        stop_event = multiprocessing.Event()
+        result = None
+        timed_out = False
+        cancelled = False
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker,
+                                 initargs=(stop_event,)) as executor:
+            futures = [executor.submit(solve_subtree, packed, prefix, bounds, deadline,
+                                       self.settings())
+                       for prefix in prefixes]
+            pending = set(futures)
+            try:
+                for future in as_completed(futures, timeout=time_left):
+                    pending.discard(future)
+                    if future.cancelled():
+                        continue
+                    solution = future.result()
+                    stats.merge(solution.stats)
+                    timed_out = timed_out or solution.timed_out
+                    cancelled = cancelled or solution.cancelled
+                    if solution.solved and result is None:
+                        result = solution
+                        stop_event.set()
+                        for other in futures:
+                            other.cancel()
+            except FuturesTimeout:
+                timed_out = True
+                stop_event.set()
+                for other in futures:
+                    other.cancel()
+
+                # The subtrees already running stop at their next check; keep
+                # the counters of the work they did
+                for future in pending:
+                    if not future.cancelled():
+                        stats.merge(future.result().stats)
+
+        if result is not None:
+            return Solution(result.grid, result.bridge_map, True, stats)
+        puzzle.store(bridge_map)
+        return Solution(map, bridge_map, False, stats, timed_out, cancelled)
+
+# Returns the cache entry of a solution, with the bridges moved onto the
+# canonical form of the puzzle
+def cache_entry(solution, transform):
+    bridges = solution.as_dict()["bridges"]
+    return {"solved": solution.solved,
+            "bridges": transform_bridges(bridges, solution.grid.shape, transform)}
+
+# Rebuilds the solution of a map from its cache entry
+def cached_solution(map, transform, entry, stats):
+    planks = {}
+    for start_row, start_col, end_row, end_col, count in restore_bridges(entry["bridges"], map.shape, transform):
+        planks[((start_row, start_col), (end_row, end_col))] = count
+
+    bridge_map = find_bridges(map)
+    for bridge in bridge_map.values():
+        bridge.planks = planks.get((bridge.start, bridge.end), 0)
+        bridge.minimum = bridge.maximum = bridge.planks
+        bridge.done = True
+    return Solution(map, bridge_map, entry["solved"], stats)
+
+# Raised inside the search once the solver's time limit has passed
+class SearchTimeout(Exception):
+    pass
+
+# Raised inside the search once another worker has found a solution
+class SearchCancelled(Exception):
+    pass
+
+# Raised inside the search once it has used up the node limit of its run
+class SearchRestart(Exception):
+    pass
+
+# Stop signal of the split search that started this worker process
+worker_stop_event = None
+
+# Runs in each worker process of a split search
+def init_worker(stop_event):
+    global worker_stop_event
+    worker_stop_event = stop_event
+
+# Worker side of HashiSolver.solve_split. deadline is a time.time() value.
+def solve_subtree(packed, prefix, bounds, deadline, settings):
+    time_limit = None
+    if deadline is not None:
+        time_limit = max(0.0, deadline - time.time())
+    solver = HashiSolver(time_limit, stop_event=worker_stop_event, **settings)
+    return solver.solve(unpack_map(packed), prefix=prefix, bounds=bounds)
+
+# Returns the bounds of every bridge as (minimums, maximums) byte strings
+def save_bounds(puzzle):
+    return puzzle.bridge_min.tobytes(), puzzle.bridge_max.tobytes()
+
+# Tightens a freshly built puzzle to bounds saved by save_bounds from another
+# copy of it, returning False if they fail. Bridges are numbered the same way
+# for the same grid, so the bounds line up.
+def load_bounds(puzzle, bounds):
+    new_min = array("b", bounds[0])
+    new_max = array("b", bounds[1])
+    queue = []
+    for bridge in range(puzzle.num_bridges()):
+        if (puzzle.bridge_min[bridge] != new_min[bridge]
+                or puzzle.bridge_max[bridge] != new_max[bridge]):
+            if not set_bounds(puzzle, bridge, new_min[bridge], new_max[bridge], queue):
+                clear_queue(puzzle, queue)
+                return False
+    return propagate(puzzle, queue)
+
+# Makes the given (bridge, planks) assignments, returning False if one fails
+def replay(puzzle, prefix):
+    for bridge, planks in prefix:
+        if not place_bridge(bridge, planks, puzzle):
+            return False
+    return True
 
-    # Data Structures
-    island_map = find_islands(map)
-    bridge_map  = find_bridges(map)
-    find_island_bridges(bridge_map, island_map)
-
-    occupied = set()
-    initial_forward_check(island_map, bridge_map)
-
-    bridge_connectedness = find_connectedness(bridge_map, island_map)
-    bridge_order = sorted(bridge_connectedness, key=bridge_connectedness.get, reverse=False)
-
-    backtrack(0, 
-              island_map, 
-              bridge_map, 
-              len(island_map), 
-              bridge_order, 
-              occupied)
-    end = time.time()
-
-    # Print solution
-    print_solution(map, bridge_map)
-
-# Performs forward checking on constraints
-def forward_check(bridge_map, island_map):
-    
-    x = 0
-
-    for island_id in island_map:
-        island = island_map[island_id]
-        total_sum = 0
-        for bridge_id in island.bridges:
-            bridge = bridge_map[bridge_id]
-            total_sum += bridge.maximum
-
-        if island.number > total_sum:
+# Expands the first levels of the search tree, collecting the assignments that
+# lead to each open subtree. Returns True if a solution turns up on the way.
+def split_search(puzzle, depth, prefix, prefixes):
+    current_bridge = puzzle.bridge_queue.select()
+    if current_bridge == -1:
+        return True
+    if depth == 0:
+        prefixes.append(list(prefix))
+        return False
+
+    for num_planks in candidate_planks(puzzle, current_bridge):
+        mark = puzzle.trail.mark()
+        if place_bridge(current_bridge, num_planks, puzzle):
+            prefix.append((current_bridge, num_planks))
+            if split_search(puzzle, depth - 1, prefix, prefixes):
+                return True
+            prefix.pop()
+        puzzle.trail.undo(mark)
+    return False
+
+# Solves one puzzle with a fresh solver
+def solve(grid, time_limit=None):
+    return HashiSolver(time_limit).solve(grid)
+
+# Performs forward checking algorithm
+def initial_forward_check(puzzle):
+    queue = []
+    for island in range(puzzle.num_islands()):
+        enqueue_island(puzzle, queue, island)
+    if not limit_isolated_pairs(puzzle, queue):
+        return False
+    return propagate(puzzle, queue)
+
+# Two islands that would use up each other's number with a single bridge (two 1s
+# joined once, two 2s joined twice, ...) would form a closed pair, so that bridge
+# has to stay below their number unless they are the only islands in the puzzle
+def limit_isolated_pairs(puzzle, queue):
+    if puzzle.num_islands() <= 2:
+        return True
+
+    number = puzzle.island_number
+    for bridge in range(puzzle.num_bridges()):
+        start = puzzle.bridge_start[bridge]
+        end = puzzle.bridge_end[bridge]
+        if number[start] == number[end] and puzzle.bridge_max[bridge] >= number[start]:
+            if puzzle.bridge_min[bridge] > number[start] - 1:
+                puzzle.stats.prune("isolated_pair")
+                return False
+            set_bounds(puzzle, bridge, puzzle.bridge_min[bridge], number[start] - 1, queue)
+    return True
+
+# Applies the presolve rules until none of them can tighten any bridge. A rule
+# that tightens something puts every rule back on the worklist, and the sum rule
+# runs after each one. Returns False if the puzzle turns out to have no solution.
+def presolve(puzzle):
+    stats = puzzle.stats
+    worklist = deque(PRESOLVE_RULES)
+    while worklist:
+        name, rule = worklist.popleft()
+        queue = []
+        changes = rule(puzzle, queue)
+        if changes < 0:
+            clear_queue(puzzle, queue)
             return False
-    
-        total_sum = 0
-        for bridge_id in island.bridges:
-            bridge = bridge_map[bridge_id]
-            total_sum += bridge.minimum
-        
-        if island.number < total_sum:
+        if changes == 0:
+            continue
+
+        stats.fire(name, changes)
+        old_min = np.array(puzzle.bridge_min, dtype=np.int8)
+        old_max = np.array(puzzle.bridge_max, dtype=np.int8)
+        if not propagate(puzzle, queue):
             return False
-    
+        tightened = count_changed(puzzle, old_min, old_max)
+        if tightened:
+            stats.fire("island_sum", tightened)
+        for entry in PRESOLVE_RULES:
+            if entry not in worklist:
+                worklist.append(entry)
     return True
 
-# Performs forward checking algorithm
-def initial_forward_check(island_map, bridge_map, print=False):
-
-    # Sets max
-    for island_id in island_map:
-        island = island_map[island_id]
-        island.max = max(3, island.number)
-    
-    # Max search
-    changes_made = True
-    while changes_made:
-
-        islands_to_be_removed = []
-        for island_id in island_map:
-            island = island_map[island_id]
-            if island.number == 0:
-                islands_to_be_removed.append(island_id)
-        for island_id in islands_to_be_removed:
-            island_map.pop(island_id)
-
-        changes_made = False
-        for island_id in island_map:
-            island = island_map[island_id]
-            for bridge_id in island.bridges:
-                bridge = bridge_map[bridge_id]
-
-                # Find sum of all other bridges
-                max_sum = 0
-                for other_bridge_id in island.bridges:
-                    if other_bridge_id != bridge_id:
-                        other_bridge = bridge_map[other_bridge_id]
-                        max_sum += other_bridge.maximum
-                
-                diff = island.number - max_sum
-
-                if diff > bridge.minimum:
-                    if print:
-                        print(f"Island: {island_id} - Bridge: {bridge_id} - Diff: {diff} - Min: {bridge.minimum}")
-                    changes_made = True
-
-                old_minimum = bridge.minimum
-                bridge.minimum = max(bridge.minimum, diff)
-                if bridge.minimum != old_minimum:
-                    changes_made = True
-
-                if bridge.minimum == bridge.maximum:
-                    place_bridge(bridge_id, bridge.minimum, bridge_map, island_map)
-                    bridge.done = True
-        
-        for island_id in island_map:
-            island = island_map[island_id]
-            for bridge_id in island.bridges:
-                bridge = bridge_map[bridge_id]
-
-                # Find sum of all other bridges
-                min_sum = 0
-                for other_bridge_id in island.bridges:
-                    if other_bridge_id != bridge_id:
-                        other_bridge = bridge_map[other_bridge_id]
-                        min_sum += other_bridge.minimum
-                
-                diff = island.number - min_sum
-
-                if diff < bridge.maximum:
-                    if print:
-                        print(f"Island: {island_id} - Bridge: {bridge_id} - Diff: {diff} - Max: {bridge.maximum}")
-                    changes_made = True
-
-                old_maximum = bridge.maximum
-                bridge.maximum = min(bridge.maximum, diff)
-                if bridge.maximum != old_maximum:
-                    changes_made = True             
-
-                if bridge.minimum == bridge.maximum:
-                    place_bridge(bridge_id, bridge.minimum, bridge_map, island_map)
-                    bridge.done = True
-
-def place_bridge(bridge_id, planks, bridge_map, island_map):
-    if planks != 0:
-        bridge = bridge_map[bridge_id]
-        start_island = island_map[bridge.start]
-        end_island = island_map[bridge.end]
+# Returns the number of bridges whose bounds differ from the given copies
+def count_changed(puzzle, old_min, old_max):
+    new_min = np.frombuffer(puzzle.bridge_min, dtype=np.int8)
+    new_max = np.frombuffer(puzzle.bridge_max, dtype=np.int8)
+    return int(np.count_nonzero((new_min != old_min) | (new_max != old_max)))
+
+# A bridge that has to carry planks rules out every bridge crossing it
+def exclude_crossings(puzzle, queue):
+    changes = 0
+    for bridge in range(puzzle.num_bridges()):
+        if puzzle.bridge_min[bridge] == 0:
+            continue
+        for other in puzzle.bridge_crossings[bridge]:
+            if puzzle.bridge_max[other] == 0:
+                continue
+            if not set_bounds(puzzle, other, 0, 0, queue):
+                return -1
+            changes += 1
+    return changes
+
+# A bridge whose removal would cut the islands that can still be joined in two
+# is needed by every connected solution, so it carries at least one plank
+def force_cut_bridges(puzzle, queue):
+    cut_bridges = find_cut_bridges(puzzle)
+    if cut_bridges is None:
+        puzzle.stats.prune("connectivity")
+        return -1
+
+    changes = 0
+    for bridge in cut_bridges:
+        if puzzle.bridge_min[bridge] == 0:
+            if not set_bounds(puzzle, bridge, 1, puzzle.bridge_max[bridge], queue):
+                return -1
+            changes += 1
+    return changes
+
+# Returns the cut edges of the graph of islands joined by bridges that can still
+# carry planks, or None if that graph is not connected. Iterative Tarjan search.
+def find_cut_bridges(puzzle):
+    num_islands = puzzle.num_islands()
+    if num_islands == 0:
+        return []
+    order = [-1] * num_islands
+    low = [0] * num_islands
+    cut_bridges = []
+
+    order[0] = 0
+    count = 1
+    stack = [(0, -1, iter(puzzle.bridges_of(0)))]
+    while stack:
+        island, via, bridges = stack[-1]
+        for bridge in bridges:
+            if bridge == via or puzzle.bridge_max[bridge] == 0:
+                continue
+            other = puzzle.bridge_end[bridge]
+            if other == island:
+                other = puzzle.bridge_start[bridge]
+            if order[other] == -1:
+                order[other] = low[other] = count
+                count += 1
+                stack.append((other, bridge, iter(puzzle.bridges_of(other))))
+                break
+            low[island] = min(low[island], order[other])
+        else:
+            stack.pop()
+            if stack:
+                parent = stack[-1][0]
+                low[parent] = min(low[parent], low[island])
+                if low[island] > order[parent]:
+                    cut_bridges.append(via)
+
+    if count < num_islands:
+        return None
+    return cut_bridges
+
+# Failed value probing: a bound of a bridge that fails as soon as it is placed
+# and propagated is ruled out. Probing a large puzzle takes a while, so it
+# stops for the time limit and stop event like the search does.
+def probe_values(puzzle, queue):
+    changes = 0
+    trail = puzzle.trail
+    for bridge in range(puzzle.num_bridges()):
+        check_limits(puzzle)
+        for probe_max in (False, True):
+            old_min = puzzle.bridge_min[bridge]
+            old_max = puzzle.bridge_max[bridge]
+            if old_min == old_max:
+                break
+
+            planks = old_max if probe_max else old_min
+            mark = trail.mark()
+            consistent = place_bridge(bridge, planks, puzzle)
+            trail.undo(mark)
+            if consistent:
+                continue
+
+            if probe_max:
+                consistent = set_bounds(puzzle, bridge, old_min, planks - 1, queue)
+            else:
+                consistent = set_bounds(puzzle, bridge, planks + 1, old_max, queue)
+            if not consistent or not propagate(puzzle, queue):
+                return -1
+            changes += 1
+    return changes
+
+# Presolve rules by name, cheapest first. Each takes the puzzle and a
+# propagation queue and returns the number of bridges it tightened, or -1 if the
+# puzzle has no solution.
+PRESOLVE_RULES = [("crossing", exclude_crossings),
+                  ("cut_bridge", force_cut_bridges),
+                  ("probe", probe_values)]
+
+# Adds an island to the propagation queue unless it is already waiting there
+def enqueue_island(puzzle, queue, island):
+    if not puzzle.in_queue[island]:
+        puzzle.in_queue[island] = True
+        queue.append(island)
+
+# Sets new bounds on a bridge, updating the island sums and queueing both islands.
+# The old values are recorded on the trail so backtracking can restore them.
+# Returns False if the bridge now has to cross a bridge that is already there,
+# or if its value completes a learned nogood.
+def set_bounds(puzzle, bridge, new_min, new_max, queue):
+    start = puzzle.bridge_start[bridge]
+    end = puzzle.bridge_end[bridge]
+    min_change = new_min - puzzle.bridge_min[bridge]
+    max_change = new_max - puzzle.bridge_max[bridge]
+
+    trail = puzzle.trail
+
+    # A bridge that has to carry planks takes up its cells and joins the
+    # components of its islands
+    occupies = min_change and puzzle.bridge_min[bridge] == 0
+    if occupies:
+        mask = puzzle.bridge_mask[bridge]
+        if puzzle.occupied & mask:
+            puzzle.stats.prune("crossing")
+            return False
+        trail.save_attribute(puzzle, "occupied")
+        puzzle.occupied |= mask
+        puzzle.components.union(start, end)
+
+    if min_change:
+        trail.save(puzzle.bridge_min, bridge)
+        trail.save(puzzle.island_min_sum, start)
+        trail.save(puzzle.island_min_sum, end)
+        puzzle.island_min_sum[start] += min_change
+        puzzle.island_min_sum[end] += min_change
+        puzzle.bridge_min[bridge] = new_min
+    if max_change:
+        trail.save(puzzle.bridge_max, bridge)
+        trail.save(puzzle.island_max_sum, start)
+        trail.save(puzzle.island_max_sum, end)
+        puzzle.island_max_sum[start] += max_change
+        puzzle.island_max_sum[end] += max_change
+        puzzle.bridge_max[bridge] = new_max
+
+    if puzzle.bridge_queue is not None:
+        puzzle.bridge_queue.update(bridge, new_max - new_min)
+
+    enqueue_island(puzzle, queue, start)
+    enqueue_island(puzzle, queue, end)
+
+    # ... and rules out the bridges that cross it
+    if occupies:
+        for other in puzzle.bridge_crossings[bridge]:
+            if puzzle.bridge_max[other] > 0 and not set_bounds(puzzle, other, 0, 0, queue):
+                return False
+
+    if new_min == new_max:
+        if puzzle.zobrist_keys is not None:
+            trail.save_attribute(puzzle, "zobrist")
+            puzzle.zobrist ^= puzzle.zobrist_keys[bridge * 4 + new_min]
+        if puzzle.nogoods is not None:
+            return check_nogoods(puzzle, bridge * 4 + new_min, queue)
+    return True
 
-        start_island.number -= planks
-        end_island.number -= planks
+# Visits the nogoods watching a literal that has just become true. Each one
+# watches another literal that is not true if it has one left; otherwise the
+# value of its other watched literal is ruled out, which is a conflict if that
+# literal is true as well.
+def check_nogoods(puzzle, literal, queue):
+    nogoods = puzzle.nogoods
+    watchers = nogoods.watches[literal]
+    bridge_min = puzzle.bridge_min
+    bridge_max = puzzle.bridge_max
+
+    i = 0
+    while i < len(watchers):
+        nogood = watchers[i]
+        literals = nogoods.literals[nogood]
+        if len(literals) > 1 and literals[0] == literal:
+            literals[0], literals[1] = literals[1], literals[0]
+
+        # Nothing to do while the other watched literal is false
+        bridge, planks = divmod(literals[0], 4)
+        if len(literals) > 1 and not bridge_min[bridge] <= planks <= bridge_max[bridge]:
+            i += 1
+            continue
+
+        # Move the watch to a literal that is not true
+        for k in range(2, len(literals)):
+            bridge, planks = divmod(literals[k], 4)
+            if bridge_min[bridge] != planks or bridge_max[bridge] != planks:
+                literals[1], literals[k] = literals[k], literals[1]
+                nogoods.watches[literals[1]].append(nogood)
+                watchers[i] = watchers[-1]
+                watchers.pop()
+                break
+        else:
+            nogoods.bump(nogood)
+            i += 1
+
+            # Every literal but the first is true, so the first one must be false
+            bridge, planks = divmod(literals[0], 4)
+            old_min = bridge_min[bridge]
+            old_max = bridge_max[bridge]
+            if len(literals) == 1 or old_min == old_max == planks:
+                puzzle.stats.prune("nogood")
+                return False
+            if old_min == planks:
+                if not set_bounds(puzzle, bridge, planks + 1, old_max, queue):
+                    return False
+            elif old_max == planks:
+                if not set_bounds(puzzle, bridge, old_min, planks - 1, queue):
+                    return False
+    return True
+
+# Re-applies the min / max sum rule to queued islands until nothing changes
+def propagate(puzzle, queue):
+    number = puzzle.island_number
+    offsets = puzzle.island_offsets
+    island_bridges = puzzle.island_bridges
+    bridge_min = puzzle.bridge_min
+    bridge_max = puzzle.bridge_max
+    min_sum = puzzle.island_min_sum
+    max_sum = puzzle.island_max_sum
+    in_queue = puzzle.in_queue
+    closed = puzzle.island_closed
+    components = puzzle.components
+    num_islands = puzzle.num_islands()
+    stats = puzzle.stats
+    stats.propagations += 1
+
+    while queue:
+        island = queue.pop()
+        in_queue[island] = False
+        stats.revisions += 1
+
+        if number[island] < min_sum[island] or number[island] > max_sum[island]:
+            stats.prune("island_sum")
+            clear_queue(puzzle, queue)
+            return False
 
-        start_island.bridges.remove(bridge_id)
-        end_island.bridges.remove(bridge_id)
-        bridge.planks = planks
+        # Island complete - its component must not be cut off from the others
+        if min_sum[island] == max_sum[island]:
+            if not closed[island]:
+                puzzle.trail.save(closed, island)
+                closed[island] = True
+                root = components.close(island)
+            else:
+                root = components.find(island)
+            if components.open_count[root] == 0 and components.size[root] < num_islands:
+                stats.prune("connectivity")
+                clear_queue(puzzle, queue)
+                return False
+            continue
+
+        for k in range(offsets[island], offsets[island + 1]):
+            bridge = island_bridges[k]
+            old_min = bridge_min[bridge]
+            old_max = bridge_max[bridge]
+            if old_min == old_max:
+                continue
+
+            # Bounds given by the sum of all other bridges
+            new_min = max(old_min, number[island] - (max_sum[island] - old_max))
+            new_max = min(old_max, number[island] - (min_sum[island] - old_min))
+            if new_max < new_min:
+                stats.prune("empty_domain")
+                clear_queue(puzzle, queue)
+                return False
+
+            if new_min != old_min or new_max != old_max:
+                if not set_bounds(puzzle, bridge, new_min, new_max, queue):
+                    clear_queue(puzzle, queue)
+                    return False
+
+    return True
+
+# Empties the propagation queue after a failure
+def clear_queue(puzzle, queue):
+    for island in queue:
+        puzzle.in_queue[island] = False
+    queue.clear()
+
+# Places a bridge with the given number of planks and propagates the change
+def place_bridge(bridge, planks, puzzle):
+    queue = []
+    if not set_bounds(puzzle, bridge, planks, planks, queue):
+        clear_queue(puzzle, queue)
+        return False
+    return propagate(puzzle, queue)
 
 # Finds a mapping of islands to connected bridges
 def find_island_bridges(bridge_map, island_map):
@@ -197,260 +863,339 @@ def find_bridge_connections(bridge_starts, bridge_ends):
     return connections
 
 # Finds the sum of possible bridges connected to the start and end of a bridge
-def find_connectedness(bridge_map, island_map):
+def find_connectedness(puzzle):
+    # Number of undecided bridges on each island
+    open_bridges = [0] * puzzle.num_islands()
+    for bridge in range(puzzle.num_bridges()):
+        if not puzzle.done(bridge):
+            open_bridges[puzzle.bridge_start[bridge]] += 1
+            open_bridges[puzzle.bridge_end[bridge]] += 1
+
     # Mapping of bridge to connectedness
     bridge_connectedness = {}
-    for bridge_id in bridge_map:
-        bridge = bridge_map[bridge_id]
-        if bridge.planks == 0 and bridge.done == False:
-            bridge_connectedness[bridge_id] = 0
-            if bridge.start in island_map:
-                bridge_connectedness[bridge_id] += len(island_map[bridge.start].bridges)
-            if bridge.end in island_map:
-                bridge_connectedness[bridge_id] += len(island_map[bridge.end].bridges)
+    for bridge in range(puzzle.num_bridges()):
+        if not puzzle.done(bridge):
+            start = puzzle.bridge_start[bridge]
+            end = puzzle.bridge_end[bridge]
+            bridge_connectedness[bridge] = open_bridges[start] + open_bridges[end]
 
     return bridge_connectedness
 
-# Prints solution
-def print_solution(map, bridge_map):
-    result = []
-    nrows, ncols = map.shape
-    code = " 123456789abc"
+# Characters of the rendered board: islands by number, bridges by planks
+ISLAND_CODES = np.array([ord(ch) for ch in " 123456789abc"], dtype=np.uint32)
+HORIZONTAL_CODES = [0, ord("─"), ord("═"), ord("E")]
+VERTICAL_CODES = [0, ord("│"), ord("\""), ord("#")]
 
-    # Add islands
-    for row in range(nrows):
-        result.append([])
-        for col in range(ncols):
-            result[row].append(code[map[row][col]])
-
-    horizontal_bridge = {1: "─", 2: "═", 3: "E"}
-    vertical_bridge = {1: "│", 2: "\"", 3: "#"}
-
-    # Add bridges
-    for bridge_id in bridge_map:
-        bridge = bridge_map[bridge_id]
+# Draws the solution as text, one line per row. The board is built as an array
+# of code points with a newline column and painted one slice per bridge.
+def render_solution(map, bridge_map):
+    nrows, ncols = map.shape
+    board = np.empty((nrows, ncols + 1), dtype="<u4")
+    board[:, :ncols] = ISLAND_CODES[map]
+    board[:, ncols] = ord("\n")
 
+    for bridge in bridge_map.values():
         if bridge.planks != 0:
-            symbol = horizontal_bridge[bridge.planks] if bridge.horizontal else vertical_bridge[bridge.planks]
-            for (row, col) in bridge.indices:
-                    result[row][col] = symbol
-    for row in result:
-        print("".join(row))
+            (start_row, start_col), (end_row, end_col) = bridge.start, bridge.end
+            if bridge.horizontal:
+                board[start_row, start_col + 1:end_col] = HORIZONTAL_CODES[bridge.planks]
+            else:
+                board[start_row + 1:end_row, start_col] = VERTICAL_CODES[bridge.planks]
+    return board.tobytes().decode("utf-32-le")
+
+# Prints solution
+def print_solution(map, bridge_map, file=None):
+    if file is None:
+        file = sys.stdout
+    file.write(render_solution(map, bridge_map))
+
+# Builds the queue that hands out undecided bridges, fewest values first and
+# ties broken by the lowest connectedness. With rng, the bridges left tied
+# after that come out in a random order.
+def make_bridge_queue(puzzle, bridge_connectedness, rng=None):
+    priority = [0] * puzzle.num_bridges()
+    for bridge in bridge_connectedness:
+        priority[bridge] = bridge_connectedness[bridge]
+
+    tie_break = None
+    if rng is not None:
+        tie_break = list(range(puzzle.num_bridges()))
+        rng.shuffle(tie_break)
+
+    bridge_queue = BridgeQueue(priority, puzzle.trail, tie_break)
+    for bridge in bridge_connectedness:
+        bridge_queue.move(bridge, bridge_queue.bucket_index(
+            bridge, puzzle.bridge_max[bridge] - puzzle.bridge_min[bridge]))
+    return bridge_queue
+
+# Returns the plank counts to try for a bridge, most planks first and 0 last
+# unless the puzzle has another ValueOrder
+def candidate_planks(puzzle, bridge):
+    old_min = puzzle.bridge_min[bridge]
+    old_max = puzzle.bridge_max[bridge]
+
+    # No planks can be placed if another bridge is in the way. A bridge that
+    # already has to carry planks has marked its own cells.
+    if old_min == 0 and puzzle.occupied & puzzle.bridge_mask[bridge]:
+        return [0]
+    values = list(range(old_max, old_min - 1, -1))
+    if puzzle.value_order is not None:
+        values = puzzle.value_order.order(puzzle, bridge, values)
+    return values
+
+# Gives up the search if the time limit has passed or another worker has finished
+def check_limits(puzzle):
+    if puzzle.deadline is not None and time.perf_counter() > puzzle.deadline:
+        raise SearchTimeout()
+    if puzzle.stop_event is not None and puzzle.stop_event.is_set():
+        raise SearchCancelled()
 
 # Searches for solution 
-def backtrack(bridge_idx, 
-              island_map, 
-              bridge_map,
-              remaining_islands, 
-              bridge_order, 
-              occupied):
-
-    # Base case - solution found
-    if remaining_islands == 0:
-        return True
-    
-    # Base case - no more bridges
-    if bridge_idx == len(bridge_order):
-        return False
-    
-    if not forward_check(bridge_map, island_map):
-        return False
+#   Depth-first search with an explicit stack instead of recursion, so the depth
+#   is only bounded by memory. Each frame is a choice point: the bridge being
+#   decided, its plank counts, the index of the next one to try, the trail mark
+#   to undo to before trying it, and the state's hash and node count for the
+#   transposition table. prefix holds the assignments already made by replay,
+#   which every nogood learned below has to include.
+def backtrack(puzzle, prefix=()):
+    stats = puzzle.stats
+    trail = puzzle.trail
+    queue = puzzle.bridge_queue
+    table = puzzle.table
+
+    # Literals of the decisions leading to the current node. The last value
+    # left for a bridge follows from the decisions above it once the other
+    # values have failed, so it is recorded as None and left out of nogoods.
+    path = [bridge * 4 + planks for bridge, planks in prefix]
+    stack = []
+    node_limit = puzzle.node_limit
+
+    current_bridge = queue.select()
+    while current_bridge != -1:
+        depth = len(stack)
+        stats.nodes += 1
+        if node_limit is not None and stats.nodes > node_limit:
+            raise SearchRestart()
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if stats.nodes % 1024 == 0:
+            check_limits(puzzle)
+
+        # A state that already failed along another path has no values to try
+        if table is not None and table.contains(puzzle.zobrist):
+            stats.prune("transposition")
+            values = []
+        else:
+            values = candidate_planks(puzzle, current_bridge)
+        stack.append([current_bridge, values, 0, trail.mark(), puzzle.zobrist, stats.nodes])
+
+        # Place the next plank count of the newest choice point, going back to
+        # older choice points as they run out of values
+        while stack:
+            frame = stack[-1]
+            bridge, values, index, mark = frame[:4]
+            if index == len(values):
+                stack.pop()
+                if table is not None and values:
+                    table.store(frame[4], stats.nodes - frame[5])
+                if stack:
+                    stats.backtracks += 1
+                    learn(puzzle, path)
+                    path.pop()
+                    trail.undo(stack[-1][3])
+                continue
+
+            frame[2] = index + 1
+            num_planks = values[index]
+            literal = bridge * 4 + num_planks if index + 1 < len(values) else None
+            path.append(literal)
+            if place_bridge(bridge, num_planks, puzzle):
+                break
+            stats.backtracks += 1
+            learn(puzzle, path)
+            path.pop()
+            trail.undo(mark)
+        else:
+            return False
 
-    # Find next bridge
-    current_bridge_id = bridge_order[bridge_idx]
-    current_bridge = bridge_map[current_bridge_id]
-
-    if current_bridge.done:
-        return backtrack(bridge_idx + 1, 
-                         island_map, 
-                         bridge_map, 
-                         remaining_islands, 
-                         bridge_order, 
-                         occupied)    
-    
-    # Base case - bridge can't be placed due to another bridge being in its way
-    for index in current_bridge.indices:
-        if index in occupied:
-            return backtrack(bridge_idx + 1, 
-                             island_map, 
-                             bridge_map, 
-                             remaining_islands, 
-                             bridge_order, 
-                             occupied)
-
-    start = current_bridge.start
-    end = current_bridge.end
-
-    if start not in island_map or end not in island_map:
-        return backtrack(bridge_idx + 1, 
-                         island_map, 
-                         bridge_map, 
-                         remaining_islands, 
-                         bridge_order, 
-                         occupied)
-
-    start_island = island_map[start]
-    end_island = island_map[end]
-
-    # # Case 1 - place bridge
-    mark_occupied(occupied, current_bridge.indices)
-    
-    start_planks = min(3, start_island.number, end_island.number, current_bridge.maximum)
-    end_planks = max(0, current_bridge.minimum - 1)
-
-    old_max = current_bridge.maximum
-    old_min = current_bridge.minimum
-    start_island.bridges.remove(current_bridge_id)
-    end_island.bridges.remove(current_bridge_id)
-    current_bridge.done = True
-
-    for num_planks in range(start_planks, end_planks, -1):
-        
-        # Place plank
-        current_bridge.planks = num_planks
-        start_island.number -= num_planks
-        end_island.number -= num_planks
-
-        current_bridge.maximum = num_planks
-        current_bridge.minimum = num_planks
-
-        # Adjust number of remaining islands
-        new_remaining_islands = remaining_islands
-        if start_island.number == 0:
-            new_remaining_islands -= 1
-        if end_island.number == 0:
-            new_remaining_islands -= 1
-        if new_remaining_islands == 0:
-            return True
-
-        if backtrack(bridge_idx + 1,
-                    island_map, 
-                    bridge_map, 
-                    new_remaining_islands, 
-                    bridge_order, 
-                    occupied):
-            return True
-        
-        start_island.number += num_planks
-        end_island.number += num_planks
-        current_bridge.planks = 0
-        
-    # Free up occupied indices
-    for index in current_bridge.indices:
-        occupied.remove(index)
-
-    current_bridge.maximum = old_max
-    current_bridge.minimum = old_min
-    current_bridge.done = False
-
-    start_island.bridges.append(current_bridge_id)
-    end_island.bridges.append(current_bridge_id)
-
-    # Case 2 - skip bridge
-    if current_bridge.minimum == 0:
-        return backtrack(bridge_idx + 1, 
-                        island_map, 
-                        bridge_map, 
-                        remaining_islands, 
-                        bridge_order, 
-                        occupied)
-    return False
+        current_bridge = queue.select()
+
+    # Every bridge is decided
+    return True
 
-# Marks bridge indices as occupied
-def mark_occupied(occupied, bridge_indices):
-    for index in bridge_indices:
-        occupied.add(index)
+# Searches with restarts: each run is a backtrack search limited to the nodes
+# given by the schedule, and a run that uses them up is undone and replaced by
+# one with the ties in the bridge order broken at random. The first run keeps
+# the usual order. Learned nogoods and failed states stay on the puzzle, so
+# later runs do not search again what earlier ones proved to fail.
+def restart_search(puzzle, prefix, bridge_connectedness, schedule, rng):
+    stats = puzzle.stats
+    mark = puzzle.trail.mark()
+    run = 0
+    while True:
+        puzzle.node_limit = stats.nodes + schedule.limit(run)
+        try:
+            return backtrack(puzzle, prefix)
+        except SearchRestart:
+            pass
+        puzzle.trail.undo(mark)
+        stats.restarts += 1
+        run += 1
+        puzzle.bridge_queue = make_bridge_queue(puzzle, bridge_connectedness, rng)
+
+# Records the decisions of a failed path as a nogood, deepest first so that
+# the watches fall on the literals undone first
+def learn(puzzle, path):
+    if puzzle.nogoods is not None:
+        literals = [literal for literal in reversed(path) if literal is not None]
+        if puzzle.nogoods.add(literals):
+            puzzle.stats.nogoods += 1
 
 # Finds islands in the map
 def find_islands(map):
+    rows, cols = np.nonzero(map)
+    numbers = map[rows, cols]
+
     islands = {}
-    nrow, ncol = map.shape
-    
-    for r in range(nrow):
-        for c in range(ncol):
-            if map[r,c] != 0:
-                island = Island(r, c, map[r,c])
-                islands[(r, c)] = island
+    for r, c, number in zip(rows.tolist(), cols.tolist(), numbers.tolist()):
+        islands[(r, c)] = Island(r, c, number)
     return islands
 
-# Finds bridges in the map
+# Pairs up consecutive islands along the same line. lines and positions are the
+# coordinates of the islands sorted by line, then by position, as returned by
+# np.nonzero. Returns the line and the two positions of every pair.
+def pair_neighbours(lines, positions):
+    same_line = lines[1:] == lines[:-1]
+    return (lines[1:][same_line].tolist(),
+            positions[:-1][same_line].tolist(),
+            positions[1:][same_line].tolist())
+
+# Finds bridges in the map. Horizontal bridges are numbered first, row by row,
+# then vertical bridges column by column.
 def find_bridges(map):
-    # Variables
-    nrow, ncol = map.shape
-    num_bridges = 0
-
     # Data Structures
     bridge_map = {} # mapping of brdige IDs to bridges
 
     # Perform horizontal search
-    for r in range(nrow):
-        island_a, island_b = -1, -1
-
-        # Find first island
-        for c in range(ncol):
-            if map[r, c] != 0:
-                island_a = c
-                break
-        
-        # Mark bridges in current row
-        if island_a != -1:
-            for c in range(island_a+1, ncol):
-                if map[r, c] != 0:
-                    island_b = c
-                    bridge = Bridge(num_bridges, (r, island_a), (r, island_b), True)
-                    bridge_map[num_bridges] = bridge
-                    num_bridges += 1
-                    island_a = island_b
+    rows, cols = np.nonzero(map)
+    for r, a, b in zip(*pair_neighbours(rows, cols)):
+        num_bridges = len(bridge_map)
+        bridge_map[num_bridges] = Bridge(num_bridges, (r, a), (r, b), True)
 
     # Perform vertical search
-    for c in range(ncol):
-        island_a, island_b = -1, -1
-
-        # Find first island
-        for r in range(nrow):
-            if map[r, c] != 0:
-                island_a = r
-                break
-        
-        # Mark bridges in current column
-        if island_a != -1:
-            for r in range(island_a+1, nrow):
-                if map[r, c] != 0:
-                    island_b = r
-                    bridge = Bridge(num_bridges, (island_a, c), (island_b, c), False)
-                    bridge_map[num_bridges] = bridge
-                    num_bridges += 1
-                    island_a = island_b
+    cols, rows = np.nonzero(map.T)
+    for c, a, b in zip(*pair_neighbours(cols, rows)):
+        num_bridges = len(bridge_map)
+        bridge_map[num_bridges] = Bridge(num_bridges, (a, c), (b, c), False)
 
     return bridge_map
         
+# Scans the first puzzle on stdin
 def scan_map():
-    text = []
-    for line in sys.stdin:
-
-        if line == "\n": 
-            break
-
-        row = []
-        for ch in line:
-            n = ord(ch)
-            if n >= 48 and n <= 57:    # between '0' and '9'
-                row.append(n - 48)
-            elif n >= 97 and n <= 122: # between 'a' and 'z'
-                row.append(n - 87)
-            elif ch == '.':
-                row.append(0)
-        text.append(row)
-
-    nrow = len(text)
-    ncol = len(text[0])
-
-    map = np.zeros((nrow,ncol),dtype=np.int32)
-    for r in range(nrow):
-        for c in range(ncol):
-            map[r,c] = text[r][c]
-    
+    for nrow, ncol, map in scan_maps(sys.stdin.buffer):
+        return nrow, ncol, map
+    raise ValueError("no puzzle found on stdin")
+
+# Characters of a puzzle row and the island number of each. Islands go up to
+# 12 ('c'), so headings such as "5x5" in sample.txt are not puzzle rows.
+PUZZLE_CHARS = b".0123456789abc"
+CELL_VALUES = np.zeros(256, dtype=np.int32)
+CELL_VALUES[list(PUZZLE_CHARS)] = [0] + list(range(13))
+
+# Decodes the rows of one puzzle, given as bytes, into a numpy array
+def make_map(rows):
+    cells = np.frombuffer(b"".join(rows), dtype=np.uint8)
+    map = CELL_VALUES[cells].reshape(len(rows), len(rows[0]))
+    nrow, ncol = map.shape
     return nrow, ncol, map
 
+# Returns True if the line, given as bytes, is a row of a puzzle
+def is_puzzle_row(line):
+    line = line.rstrip()
+    return bool(line) and not line.translate(None, PUZZLE_CHARS)
+
+# Scans every puzzle in a binary stream or other iterable of byte lines,
+# yielding one map at a time. Puzzles are separated by blank lines, and any other
+# line that is not a puzzle row ends the current puzzle and is skipped.
+def scan_maps(lines):
+    rows = []
+    for line in lines:
+        if is_puzzle_row(line):
+            rows.append(line.rstrip())
+        elif rows:
+            yield make_map(rows)
+            rows = []
+    if rows:
+        yield make_map(rows)
+
+# Scans every puzzle in a file like scan_maps. The file is memory-mapped, so a
+# large corpus is paged in by the OS as it is read instead of loaded up front.
+def read_maps(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from scan_maps(iter(data.readline, b""))
+
+# Scans the puzzles of a file path or of a binary stream
+def open_maps(source):
+    if isinstance(source, (str, os.PathLike)):
+        return read_maps(source)
+    return scan_maps(source)
+
+# Solves every puzzle in a file path or binary stream in order, yielding
+# (solution, seconds) pairs. With a Profiler, puzzle i is profiled as "puzzle-i".
+def solve_batch(source, solver=None, profiler=None):
+    if solver is None:
+        solver = HashiSolver()
+    for index, (nrow, ncol, map) in enumerate(open_maps(source)):
+        start = time.perf_counter()
+        if profiler is None:
+            solution = solver.solve(map)
+        else:
+            with profiler.run("puzzle-%d" % index):
+                solution = solver.solve(map)
+        yield solution, time.perf_counter() - start
+
+# Packs a map into (nrow, ncol, bytes) with one byte per cell, for sending to
+# worker processes
+def pack_map(map):
+    nrow, ncol = map.shape
+    return nrow, ncol, map.astype(np.uint8).tobytes()
+
+# Rebuilds a map packed by pack_map
+def unpack_map(packed):
+    nrow, ncol, cells = packed
+    return np.frombuffer(cells, dtype=np.uint8).reshape(nrow, ncol).astype(np.int32)
+
+# Solver of each worker process of solve_batch_parallel
+worker_solver = None
+
+# Runs in each worker process of solve_batch_parallel
+def init_batch_worker(time_limit, cache_path, settings):
+    global worker_solver
+    worker_solver = HashiSolver(time_limit, cache=open_cache(cache_path), **(settings or {}))
+
+# Worker side of solve_batch_parallel
+def solve_packed(packed):
+    start = time.perf_counter()
+    solution = worker_solver.solve(unpack_map(packed))
+    return solution, time.perf_counter() - start
+
+# Solves every puzzle in a file path or binary stream on a pool of worker
+# processes, yielding (solution, seconds) pairs in input order. Puzzles are sent
+# in chunks so small puzzles do not pay one round trip each. Each worker
+# builds its HashiSolver once: with cache_path it gets a SolutionCache as
+# opened by open_cache, and settings holds further HashiSolver options.
+def solve_batch_parallel(source, jobs, time_limit=None, chunksize=None, cache_path=None,
+                         settings=None):
+    packed = [pack_map(map) for nrow, ncol, map in open_maps(source)]
+    if chunksize is None:
+        chunksize = max(1, len(packed) // (4 * jobs))
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_batch_worker,
+                             initargs=(time_limit, cache_path, settings)) as executor:
+        yield from executor.map(solve_packed, packed, chunksize=chunksize)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
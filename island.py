@@ -1,4 +1,6 @@
 class Island(object):
+    __slots__ = ("x", "y", "number", "bridges")
+
     def __init__(self, x, y, number):
         self.x = x
         self.y = y
@@ -6,4 +8,19 @@ class Island(object):
         self.bridges = []
 
     def add_bridge(self, bridge):
-        self.bridges.append(bridge)
\ No newline at end of file
+        self.bridges.append(bridge)
+
+    # Planks on the island's bridges whose value is decided
+    def assigned_sum(self, bridge_map):
+        total_sum = 0
+        for bridge_id in self.bridges:
+            bridge = bridge_map[bridge_id]
+            if bridge.minimum == bridge.maximum:
+                total_sum += bridge.minimum
+        return total_sum
+
+    def done(self, bridge_map):
+        return self.assigned_sum(bridge_map) == self.number
+
+    def over(self, bridge_map):
+        return self.assigned_sum(bridge_map) > self.number
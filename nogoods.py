@@ -0,0 +1,57 @@
+# Learned nogoods
+#   A nogood is a set of assignments, each bridge = planks, that cannot all hold
+#   in a solution. An assignment is stored as the literal bridge * 4 + planks.
+#   Each nogood watches two of its literals, and the search only looks at a
+#   nogood when one of its watched literals becomes true. It then moves the
+#   watch to another literal, or rules out the last one that is not true yet.
+#   Nogoods longer than max_size are not kept. When max_nogoods are stored, the
+#   less active half (the nogoods that have pruned the least) is dropped.
+class NogoodStore(object):
+    __slots__ = ("literals", "activity", "watches", "max_nogoods", "max_size", "next_id")
+
+    def __init__(self, num_bridges, max_nogoods=10000, max_size=12):
+        self.literals = {}
+        self.activity = {}
+        self.watches = [[] for _ in range(4 * num_bridges)]
+        self.max_nogoods = max_nogoods
+        self.max_size = max_size
+        self.next_id = 0
+
+    # Stores a nogood, watching its first two literals. Returns False if it is
+    # empty or too long to keep.
+    def add(self, literals):
+        if not literals or len(literals) > self.max_size:
+            return False
+        if len(self.literals) >= self.max_nogoods:
+            self.evict()
+
+        nogood = self.next_id
+        self.next_id += 1
+        self.literals[nogood] = list(literals)
+        self.activity[nogood] = 0
+        for literal in literals[:2]:
+            self.watches[literal].append(nogood)
+        return True
+
+    # Records that a nogood has pruned the search
+    def bump(self, nogood):
+        self.activity[nogood] += 1
+
+    # Drops the less active half of the nogoods, older ones first on ties, and
+    # halves the activity of the rest so that old activity fades
+    def evict(self):
+        ranked = sorted(self.literals, key=lambda nogood: (self.activity[nogood], nogood))
+        for nogood in ranked[:max(1, len(ranked) // 2)]:
+            del self.literals[nogood]
+            del self.activity[nogood]
+        for nogood in self.activity:
+            self.activity[nogood] //= 2
+
+        for watchers in self.watches:
+            watchers.clear()
+        for nogood, literals in self.literals.items():
+            for literal in literals[:2]:
+                self.watches[literal].append(nogood)
+
+    def __len__(self):
+        return len(self.literals)
@@ -0,0 +1,96 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Per-puzzle profiles for --profile
+#   Every profiled run writes its own file to directory: <name>.pstats with the
+#   "cprofile" mode, or <name>.collapsed with the "sample" mode. The sampler
+#   looks at the profiled thread's stack every interval seconds and writes one
+#   "frame;frame;... count" line per distinct stack, the input format of
+#   flamegraph.pl and speedscope. finish() adds up every run into all.pstats or
+#   all.collapsed, for batches. The sampler only runs when it gets the GIL, so
+#   the switch interval is lowered to the sampling interval while it is on,
+#   and samples taken inside the profiler's own code are thrown away.
+class Profiler(object):
+    __slots__ = ("directory", "mode", "interval", "total_stats", "total_stacks")
+
+    MODES = ("cprofile", "sample")
+
+    def __init__(self, directory, mode="cprofile", interval=0.001):
+        if mode not in self.MODES:
+            raise ValueError("unknown profile mode: %s" % mode)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.mode = mode
+        self.interval = interval
+        self.total_stats = None
+        self.total_stacks = Counter()
+
+    # Profiles the enclosed block as the run called name
+    @contextmanager
+    def run(self, name):
+        if self.mode == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                path = os.path.join(self.directory, name + ".pstats")
+                profile.dump_stats(path)
+                if self.total_stats is None:
+                    self.total_stats = pstats.Stats(path)
+                else:
+                    self.total_stats.add(path)
+        else:
+            stacks = Counter()
+            stop = threading.Event()
+            switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(switch_interval, self.interval))
+            sampler = threading.Thread(target=sample_stacks,
+                                       args=(threading.get_ident(), stacks, stop, self.interval),
+                                       daemon=True)
+            sampler.start()
+            try:
+                yield
+            finally:
+                stop.set()
+                sampler.join()
+                sys.setswitchinterval(switch_interval)
+                write_collapsed(os.path.join(self.directory, name + ".collapsed"), stacks)
+                self.total_stacks.update(stacks)
+
+    # Writes the profile of every run added together
+    def finish(self):
+        if self.total_stats is not None:
+            self.total_stats.dump_stats(os.path.join(self.directory, "all.pstats"))
+        if self.total_stacks:
+            write_collapsed(os.path.join(self.directory, "all.collapsed"), self.total_stacks)
+
+# Files of the profiler itself, whose frames only show up while it starts or stops
+PROFILER_FILES = (os.path.abspath(__file__), os.path.abspath(threading.__file__))
+
+# Counts the stacks of the given thread, outermost frame first, until stop is set
+def sample_stacks(thread_id, stacks, stop, interval):
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if os.path.abspath(code.co_filename) in PROFILER_FILES:
+                names = []
+                break
+            names.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename),
+                                         code.co_firstlineno))
+            frame = frame.f_back
+        if names:
+            stacks[";".join(reversed(names))] += 1
+
+def write_collapsed(path, stacks):
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write("%s %d\n" % (stack, count))
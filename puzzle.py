@@ -0,0 +1,191 @@
+from array import array
+
+from stats import SolverStats
+from trail import Trail
+from union_find import UnionFind
+
+# Compact puzzle model
+#   Islands and bridges are numbered 0..n-1 and every per-object field lives in
+#   its own parallel array, so the search reads flat integers instead of chasing
+#   dict lookups and attributes on Bridge / Island objects. The bridges of each
+#   island are stored CSR-style: the bridges of island i are
+#   island_bridges[island_offsets[i]:island_offsets[i + 1]].
+class Puzzle(object):
+    __slots__ = ("island_ids",
+                 "island_number",
+                 "island_offsets",
+                 "island_bridges",
+                 "bridge_ids",
+                 "bridge_start",
+                 "bridge_end",
+                 "bridge_mask",
+                 "bridge_crossings",
+                 "bridge_min",
+                 "bridge_max",
+                 "island_min_sum",
+                 "island_max_sum",
+                 "in_queue",
+                 "island_closed",
+                 "components",
+                 "occupied",
+                 "bridge_queue",
+                 "stats",
+                 "deadline",
+                 "node_limit",
+                 "stop_event",
+                 "nogoods",
+                 "table",
+                 "value_order",
+                 "zobrist_keys",
+                 "zobrist",
+                 "trail")
+
+    def __init__(self, island_map, bridge_map):
+        # Islands
+        self.island_ids = list(island_map)
+        island_index = {}
+        for i, island_id in enumerate(self.island_ids):
+            island_index[island_id] = i
+
+        self.island_number = array("i", [int(island_map[i].number) for i in self.island_ids])
+
+        # Bridges
+        self.bridge_ids = list(bridge_map)
+        bridges = [bridge_map[b] for b in self.bridge_ids]
+        self.bridge_start = array("i", [island_index[b.start] for b in bridges])
+        self.bridge_end = array("i", [island_index[b.end] for b in bridges])
+
+        # Cells covered by each bridge, as bits of one integer for the whole grid
+        width = max((island_map[i].y for i in self.island_ids), default=0) + 1
+        self.bridge_mask = []
+        for b in bridges:
+            mask = 0
+            for (row, col) in b.indices:
+                mask |= 1 << (row * width + col)
+            self.bridge_mask.append(mask)
+
+        # Bridges that cross each other, as an integer array per bridge
+        horizontal_at = {}
+        for b, bridge in enumerate(bridges):
+            if bridge.horizontal:
+                for cell in bridge.indices:
+                    horizontal_at[cell] = b
+        crossings = [[] for _ in bridges]
+        for b, bridge in enumerate(bridges):
+            if not bridge.horizontal:
+                for cell in bridge.indices:
+                    h = horizontal_at.get(cell)
+                    if h is not None:
+                        crossings[b].append(h)
+                        crossings[h].append(b)
+        self.bridge_crossings = [array("i", crossing) for crossing in crossings]
+
+        self.bridge_min = array("b", [b.minimum for b in bridges])
+        self.bridge_max = array("b", [b.maximum for b in bridges])
+
+        # A bridge can never carry more planks than either of its islands needs
+        for b in range(len(bridges)):
+            self.bridge_max[b] = min(self.bridge_max[b],
+                                     self.island_number[self.bridge_start[b]],
+                                     self.island_number[self.bridge_end[b]])
+
+        # Island -> bridge adjacency
+        num_islands = len(self.island_ids)
+        degree = array("i", bytes(4 * num_islands))
+        for b in range(len(bridges)):
+            degree[self.bridge_start[b]] += 1
+            degree[self.bridge_end[b]] += 1
+
+        offsets = array("i", [0])
+        for i in range(num_islands):
+            offsets.append(offsets[i] + degree[i])
+
+        fill = array("i", offsets[:-1])
+        adjacency = array("i", bytes(4 * offsets[-1]))
+        for b in range(len(bridges)):
+            for i in (self.bridge_start[b], self.bridge_end[b]):
+                adjacency[fill[i]] = b
+                fill[i] += 1
+
+        self.island_offsets = offsets
+        self.island_bridges = adjacency
+
+        # Running sums of the bounds of each island's bridges
+        self.island_min_sum = array("i", bytes(4 * num_islands))
+        self.island_max_sum = array("i", bytes(4 * num_islands))
+        for b in range(len(bridges)):
+            for i in (self.bridge_start[b], self.bridge_end[b]):
+                self.island_min_sum[i] += self.bridge_min[b]
+                self.island_max_sum[i] += self.bridge_max[b]
+
+        # Islands currently waiting in the propagation queue
+        self.in_queue = bytearray(num_islands)
+
+        # Undo log of every bound changed by the search
+        self.trail = Trail()
+
+        # Islands that cannot take more planks, and the groups joined by bridges
+        self.island_closed = bytearray(num_islands)
+        self.components = UnionFind(num_islands, self.trail)
+
+        # Cells covered by bridges that have to carry planks
+        self.occupied = 0
+
+        # Undecided bridges, ordered for the search once it starts
+        self.bridge_queue = None
+
+        self.stats = SolverStats()
+
+        # perf_counter() time after which the search gives up, if any
+        self.deadline = None
+
+        # stats.nodes count at which the search starts over, if it restarts
+        self.node_limit = None
+
+        # Event that tells the search to give up once it is set, if any
+        self.stop_event = None
+
+        # NogoodStore of the conflicts learned by the search, if any
+        self.nogoods = None
+
+        # TranspositionTable of failed states, if any, with the Zobrist key of
+        # every (bridge, planks) pair and the hash of the fixed bridges
+        self.table = None
+
+        # ValueOrder giving the order to try plank counts in, if not descending
+        self.value_order = None
+        self.zobrist_keys = None
+        self.zobrist = 0
+
+    # Returns the number of islands
+    def num_islands(self):
+        return len(self.island_ids)
+
+    # Returns the number of bridges
+    def num_bridges(self):
+        return len(self.bridge_ids)
+
+    # Returns the ids of the bridges connected to island i
+    def bridges_of(self, i):
+        return self.island_bridges[self.island_offsets[i]:self.island_offsets[i + 1]]
+
+    # Starts hashing the fixed bridges with random keys drawn from rng
+    def start_zobrist(self, rng):
+        self.zobrist_keys = array("Q", [rng.getrandbits(64) for _ in range(4 * self.num_bridges())])
+        self.zobrist = 0
+        for b in range(self.num_bridges()):
+            if self.done(b):
+                self.zobrist ^= self.zobrist_keys[4 * b + self.bridge_min[b]]
+
+    # Returns True if the bridge has a single value left
+    def done(self, b):
+        return self.bridge_min[b] == self.bridge_max[b]
+
+    # Copies the planks found by the search back onto the bridge objects
+    def store(self, bridge_map):
+        for b, bridge_id in enumerate(self.bridge_ids):
+            bridge = bridge_map[bridge_id]
+            bridge.minimum = self.bridge_min[b]
+            bridge.maximum = self.bridge_max[b]
+            bridge.done = bridge.minimum == bridge.maximum
+            bridge.planks = bridge.minimum if bridge.done else 0
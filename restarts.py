@@ -0,0 +1,35 @@
+# Restart schedules
+#   A restarting search gives up after a number of nodes and starts over from
+#   the presolved state with the ties in the bridge order broken another way,
+#   so one bad early choice cannot keep it in a huge subtree for long. The node
+#   limit of run i (counting from 0) is base * luby(i + 1) with the "luby"
+#   schedule, 1 1 2 1 1 2 4 1 1 2 ..., or base * factor ** i with "geometric".
+#   Both keep growing, so the search still finishes on puzzles without a
+#   solution.
+class RestartSchedule(object):
+    __slots__ = ("schedule", "base", "factor")
+
+    SCHEDULES = ("luby", "geometric")
+
+    def __init__(self, schedule="luby", base=100, factor=1.5):
+        if schedule not in self.SCHEDULES:
+            raise ValueError("unknown restart schedule: %s" % schedule)
+        self.schedule = schedule
+        self.base = base
+        self.factor = factor
+
+    # Returns the number of nodes that run number run may search
+    def limit(self, run):
+        if self.schedule == "luby":
+            return self.base * luby(run + 1)
+        return int(self.base * self.factor ** run)
+
+# Returns the i-th term (counting from 1) of the Luby sequence
+def luby(i):
+    while True:
+        power = 1
+        while power * 2 - 1 < i:
+            power *= 2
+        if power * 2 - 1 == i:
+            return power
+        i -= power - 1
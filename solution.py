@@ -0,0 +1,42 @@
+import json
+
+# Result of solving one puzzle
+#   grid is the puzzle as an array of island numbers and bridge_map holds the
+#   candidate bridges with the planks chosen for them. If no solution was found,
+#   solved is False and the bridges hold whatever the search could decide;
+#   timed_out tells whether it gave up because of the solver's time limit, and
+#   cancelled whether it was stopped through the solver's stop_event.
+class Solution(object):
+    __slots__ = ("grid", "bridge_map", "solved", "stats", "timed_out", "cancelled")
+
+    def __init__(self, grid, bridge_map, solved, stats, timed_out=False, cancelled=False):
+        self.grid = grid
+        self.bridge_map = bridge_map
+        self.solved = solved
+        self.stats = stats
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    # Returns True if the search ran to the end, so an unsolved puzzle is
+    # known to have no solution
+    def complete(self):
+        return self.solved or not (self.timed_out or self.cancelled)
+
+    # Returns (start, end, planks) for every bridge that carries planks
+    def bridges(self):
+        result = []
+        for bridge_id in self.bridge_map:
+            bridge = self.bridge_map[bridge_id]
+            if bridge.planks != 0:
+                result.append((bridge.start, bridge.end, bridge.planks))
+        return result
+
+    # Bridges are listed as [start_row, start_col, end_row, end_col, planks]
+    def as_dict(self):
+        return {"solved": self.solved,
+                "timed_out": self.timed_out,
+                "bridges": [[start[0], start[1], end[0], end[1], planks]
+                            for start, end, planks in self.bridges()]}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), separators=(",", ":"))
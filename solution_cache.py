@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+# Cache of solved puzzles
+#   Puzzles are looked up by the hash of their canonical form, the smallest of
+#   the 8 rotated and mirrored copies of the grid, so a rotated or mirrored copy
+#   of a puzzle finds the solution of the original. Entries hold the bridges in
+#   the coordinates of the canonical form. The most recently used entries are
+#   kept in memory; with a path, every entry is also written to an sqlite file
+#   that other processes can share.
+class SolutionCache(object):
+    __slots__ = ("max_entries", "entries", "db", "hits", "misses")
+
+    def __init__(self, max_entries=1024, path=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions "
+                            "(key TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+            self.db.commit()
+
+    # Returns the entry stored under key, or None
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        elif self.db is not None:
+            row = self.db.execute("SELECT entry FROM solutions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry = json.loads(row[0])
+                self.remember(key, entry)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    # Stores an entry under key
+    def put(self, key, entry):
+        self.remember(key, entry)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO solutions (key, entry) VALUES (?, ?)",
+                            (key, json.dumps(entry, separators=(",", ":"))))
+            self.db.commit()
+
+    # Keeps an entry in memory, evicting the least recently used one if full
+    def remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __len__(self):
+        return len(self.entries)
+
+# Applies one of the 8 symmetries of the square to a 2D array: transform % 4
+# quarter turns, followed by a mirror image if transform >= 4
+def apply_transform(array, transform):
+    array = np.rot90(array, transform % 4)
+    if transform >= 4:
+        array = np.fliplr(array)
+    return array
+
+# Returns the hash of the canonical form of a map and the transform that turns
+# the map into it
+def canonical_form(map):
+    best = None
+    for transform in range(8):
+        copy = apply_transform(map, transform)
+        form = (copy.shape, copy.astype(np.uint8).tobytes())
+        if best is None or form < best[0]:
+            best = (form, transform)
+
+    (shape, cells), transform = best
+    key = hashlib.sha256(b"%dx%d:" % shape + cells).hexdigest()
+    return key, transform
+
+# Returns, for every cell of the transformed map, the index of the cell of the
+# original map it came from
+def source_index(shape, transform):
+    nrow, ncol = shape
+    return apply_transform(np.arange(nrow * ncol).reshape(nrow, ncol), transform)
+
+# Returns the two ends of a bridge in order, top-left first
+def bridge_ends(a, b, planks):
+    start, end = min(a, b), max(a, b)
+    return [start[0], start[1], end[0], end[1], planks]
+
+# Maps bridges [start_row, start_col, end_row, end_col, planks] of a map with the
+# given shape onto its transformed copy
+def transform_bridges(bridges, shape, transform):
+    index = source_index(shape, transform)
+    position = np.empty(index.size, dtype=np.intp)
+    position[index.ravel()] = np.arange(index.size)
+
+    ncol = shape[1]
+    width = index.shape[1]
+    result = []
+    for start_row, start_col, end_row, end_col, planks in bridges:
+        a = divmod(int(position[start_row * ncol + start_col]), width)
+        b = divmod(int(position[end_row * ncol + end_col]), width)
+        result.append(bridge_ends(a, b, planks))
+    return result
+
+# Maps bridges of the transformed copy of a map with the given shape back onto
+# the map
+def restore_bridges(bridges, shape, transform):
+    index = source_index(shape, transform)
+    ncol = shape[1]
+    result = []
+    for start_row, start_col, end_row, end_col, planks in bridges:
+        a = divmod(int(index[start_row, start_col]), ncol)
+        b = divmod(int(index[end_row, end_col]), ncol)
+        result.append(bridge_ends(a, b, planks))
+    return result
@@ -0,0 +1,70 @@
+import json
+import time
+from contextlib import contextmanager
+
+# Solver statistics
+#   Counters for the search and the time spent in each phase of one solve, so
+#   runs of different solver versions can be compared.
+class SolverStats(object):
+    __slots__ = ("nodes", "backtracks", "propagations", "revisions",
+                 "prunings", "presolve", "nogoods", "restarts", "max_depth", "phases")
+
+    def __init__(self):
+        self.nodes = 0          # bridges picked by the search
+        self.backtracks = 0     # placements undone after failing
+        self.propagations = 0   # calls to the propagator
+        self.revisions = 0      # islands taken off the propagation queue
+        self.prunings = {}      # failures, by the rule that detected them
+        self.presolve = {}      # bridges tightened by each presolve rule
+        self.nogoods = 0        # nogoods learned from failed paths
+        self.restarts = 0       # times the search started over
+        self.max_depth = 0
+        self.phases = {}        # seconds spent in each phase
+
+    # Counts a failure detected by the given rule
+    def prune(self, rule):
+        self.prunings[rule] = self.prunings.get(rule, 0) + 1
+
+    # Counts bridges tightened by the given presolve rule
+    def fire(self, rule, changes):
+        self.presolve[rule] = self.presolve.get(rule, 0) + changes
+
+    # Times the enclosed block and adds it to the named phase
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    # Adds the counters and timings of another run, such as a worker's subtree
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.backtracks += other.backtracks
+        self.propagations += other.propagations
+        self.revisions += other.revisions
+        self.nogoods += other.nogoods
+        self.restarts += other.restarts
+        for rule in other.prunings:
+            self.prunings[rule] = self.prunings.get(rule, 0) + other.prunings[rule]
+        for rule in other.presolve:
+            self.fire(rule, other.presolve[rule])
+        self.max_depth = max(self.max_depth, other.max_depth)
+        for name in other.phases:
+            self.phases[name] = self.phases.get(name, 0.0) + other.phases[name]
+
+    def as_dict(self):
+        return {"nodes": self.nodes,
+                "backtracks": self.backtracks,
+                "propagations": self.propagations,
+                "revisions": self.revisions,
+                "prunings": dict(self.prunings),
+                "presolve": dict(self.presolve),
+                "nogoods": self.nogoods,
+                "restarts": self.restarts,
+                "max_depth": self.max_depth,
+                "phases": dict(self.phases)}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True)
@@ -0,0 +1,39 @@
+from functools import partial
+
+# Undo log
+#   Before a value is overwritten during the search, its old value is pushed onto
+#   the trail. A choice point only remembers the current length of the trail, and
+#   undoing it restores the values recorded since then, newest first. Backtracking
+#   therefore costs as much as the changes made below the choice point, not as
+#   much as the size of the puzzle.
+class Trail(object):
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries = []
+
+    # Records container[key] before it is overwritten
+    def save(self, container, key):
+        self.entries.append((container.__setitem__, key, container[key]))
+
+    # Records an attribute of an object before it is overwritten
+    def save_attribute(self, obj, name):
+        self.entries.append((partial(setattr, obj), name, getattr(obj, name)))
+
+    # Records a custom undo step: restore(key, value) is called on backtracking
+    def push(self, restore, key, value):
+        self.entries.append((restore, key, value))
+
+    # Returns a choice point that can later be passed to undo
+    def mark(self):
+        return len(self.entries)
+
+    # Restores every value recorded since the given choice point
+    def undo(self, mark):
+        entries = self.entries
+        while len(entries) > mark:
+            restore, key, value = entries.pop()
+            restore(key, value)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,54 @@
+from array import array
+
+# Table of search states known to fail
+#   A state is identified by the Zobrist hash of its fixed bridges: the XOR of a
+#   random 64-bit key for every (bridge, planks) pair that is decided, which the
+#   search updates as bridges are fixed and restores on backtracking. Once every
+#   value below a state has failed, the state is stored here, and reaching it
+#   again along another path is a failure without any search.
+#
+#   The table has a fixed size of 2 ** size_bits slots, in pairs. With the
+#   "two_tier" policy the first slot of a pair keeps the entry that took the most
+#   nodes to prove and the second always takes the newest entry, so expensive
+#   failures survive long runs while recent ones still get cached. "always"
+#   stores every entry in the first slot and "preferred" only keeps the first
+#   slot's most expensive entry.
+class TranspositionTable(object):
+    __slots__ = ("keys", "work", "mask", "policy", "hits", "stores")
+
+    POLICIES = ("two_tier", "always", "preferred")
+
+    def __init__(self, size_bits=16, policy="two_tier"):
+        if policy not in self.POLICIES:
+            raise ValueError("unknown replacement policy: %s" % policy)
+        size = 1 << size_bits
+        self.keys = array("Q", bytes(8 * size))
+        self.work = array("Q", bytes(8 * size))
+        self.mask = (size - 1) & ~1
+        self.policy = policy
+        self.hits = 0
+        self.stores = 0
+
+    # Returns True if the state with the given hash is known to fail. Empty
+    # slots hold 0, so that hash is never stored.
+    def contains(self, key):
+        if key == 0:
+            return False
+        slot = key & self.mask
+        if self.keys[slot] == key or self.keys[slot + 1] == key:
+            self.hits += 1
+            return True
+        return False
+
+    # Records a failed state; work is the number of nodes it took to prove
+    def store(self, key, work):
+        if key == 0:
+            return
+        slot = key & self.mask
+        self.stores += 1
+        if self.policy == "always" or work >= self.work[slot] or self.keys[slot] == key:
+            self.keys[slot] = key
+            self.work[slot] = work
+        elif self.policy == "two_tier":
+            self.keys[slot + 1] = key
+            self.work[slot + 1] = work
@@ -0,0 +1,48 @@
+from array import array
+
+# Incremental union-find over islands
+#   Components are merged by size and never path-compressed, so each union only
+#   overwrites a few entries, which are recorded on the trail and restored when
+#   the search backtracks. Every component also counts its islands that can still
+#   take more planks; a component whose count reaches zero is closed off from the
+#   rest of the puzzle.
+class UnionFind(object):
+    __slots__ = ("parent", "size", "open_count", "trail")
+
+    def __init__(self, n, trail):
+        self.parent = array("i", range(n))
+        self.size = array("i", [1] * n)
+        self.open_count = array("i", [1] * n)
+        self.trail = trail
+
+    # Returns the representative of the component containing i
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    # Merges the components of a and b, returning the new representative
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+
+        trail = self.trail
+        trail.save(self.parent, b)
+        trail.save(self.size, a)
+        trail.save(self.open_count, a)
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        self.open_count[a] += self.open_count[b]
+        return a
+
+    # Marks island i as unable to take more planks, returning its representative
+    def close(self, i):
+        root = self.find(i)
+        self.trail.save(self.open_count, root)
+        self.open_count[root] -= 1
+        return root
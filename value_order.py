@@ -0,0 +1,86 @@
+import json
+import os
+
+# Value ordering for the search
+#   The search tries the plank counts of the bridge it picks in the order given
+#   here. "descending" tries the most planks first and "ascending" the fewest.
+#   "least_constraining" first tries the count that leaves the islands at both
+#   ends furthest from being forced: for each end, the smaller of how far the
+#   minimum sum of its bridges stays below its number and how far the maximum
+#   sum stays above it, less one for each open bridge that the planks would
+#   cross. "learned" first tries the count seen most often in earlier solutions
+#   on bridges between islands with the same numbers. record() adds a solution
+#   to those counts, and save() / load() keep them in a JSON file across runs.
+#   Ties keep the descending order.
+class ValueOrder(object):
+    __slots__ = ("strategy", "counts")
+
+    STRATEGIES = ("descending", "ascending", "least_constraining", "learned")
+
+    def __init__(self, strategy="descending"):
+        if strategy not in self.STRATEGIES:
+            raise ValueError("unknown value order: %s" % strategy)
+        self.strategy = strategy
+        self.counts = {}
+
+    # Returns the plank counts of a bridge, given in descending order, in the
+    # order to try them
+    def order(self, puzzle, bridge, values):
+        if self.strategy == "descending" or len(values) < 2:
+            return values
+        if self.strategy == "ascending":
+            return values[::-1]
+        if self.strategy == "least_constraining":
+            return sorted(values, key=lambda planks: -slack(puzzle, bridge, planks))
+        counts = self.counts.get(island_pair(puzzle, bridge))
+        if counts is None:
+            return values
+        return sorted(values, key=lambda planks: -counts[planks])
+
+    # Adds the plank counts of a solved puzzle to the learned statistics
+    def record(self, puzzle):
+        for bridge in range(puzzle.num_bridges()):
+            key = island_pair(puzzle, bridge)
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0, 0, 0, 0]
+            counts[puzzle.bridge_min[bridge]] += 1
+
+    # Adds the statistics saved in a file, if it exists
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for key, counts in json.load(f).items():
+                start, end = key.split(",")
+                old = self.counts.setdefault((int(start), int(end)), [0, 0, 0, 0])
+                for planks, count in enumerate(counts):
+                    old[planks] += count
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"%d,%d" % key: counts for key, counts in self.counts.items()}, f,
+                      sort_keys=True)
+
+# Returns the numbers of the islands at the ends of a bridge, smaller first
+def island_pair(puzzle, bridge):
+    start = puzzle.island_number[puzzle.bridge_start[bridge]]
+    end = puzzle.island_number[puzzle.bridge_end[bridge]]
+    return (start, end) if start <= end else (end, start)
+
+# Returns how far the islands of a bridge would stay from being forced with
+# the given planks on it, as described for "least_constraining"
+def slack(puzzle, bridge, planks):
+    old_min = puzzle.bridge_min[bridge]
+    old_max = puzzle.bridge_max[bridge]
+    total = 0
+    for island in (puzzle.bridge_start[bridge], puzzle.bridge_end[bridge]):
+        number = puzzle.island_number[island]
+        below = number - (puzzle.island_min_sum[island] - old_min + planks)
+        above = puzzle.island_max_sum[island] - old_max + planks - number
+        total += min(below, above)
+    if planks and old_min == 0:
+        for other in puzzle.bridge_crossings[bridge]:
+            if puzzle.bridge_max[other] > 0:
+                total -= 1
+    return total